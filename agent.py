@@ -13,7 +13,6 @@
 # 3. Run `python3 agent.py` in your terminal.
 # 4. Check the "Final_Notes" folder for your documents!
 
-import pdfplumber
 import google.generativeai as genai
 import os
 try:
@@ -22,14 +21,24 @@ except ImportError:
     pypandoc = None
 
 import asyncio
+import hashlib
 import json
+import multiprocessing
 import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from openai import OpenAI
 from docx import Document
 import audio_generator
 import feynman_generator
-import doc_styler
 import doc_visualizer
+import anki_exporter
+import qa_index
+import pdf_extractors
+import artifact_store
+import pdf_watcher
+import memory_budget
+import incremental_update
 
 import os
 from dotenv import load_dotenv
@@ -41,6 +50,17 @@ load_dotenv()
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
 OPENROUTER_BASE_URL = os.getenv('OPENROUTER_BASE_URL', "https://openrouter.ai/api/v1")
+# Set to e.g. http://127.0.0.1:8765 to send Gemini calls to mock_upstreams.py instead
+GEMINI_API_ENDPOINT = os.getenv('GEMINI_API_ENDPOINT')
+# .docx rendering runs in the background while the next Phase waits on the network.
+# "process" sidesteps the GIL for the CPU-bound styling/math work; "thread" is lighter.
+RENDER_EXECUTOR = os.getenv('RENDER_EXECUTOR', "process")
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', "2"))
+OUTPUT_FOLDER = "Final_Notes"
+# Watch mode (python agent.py --watch [folder]): how many lectures may run at once
+WATCH_CONCURRENCY = int(os.getenv('WATCH_CONCURRENCY', "2"))
+# Incremental mode (or --incremental): a re-uploaded lecture only regenerates the concepts on changed pages
+INCREMENTAL = os.getenv('INCREMENTAL', "0") == "1"
 
 if not GOOGLE_API_KEY:
     print("Warning: GOOGLE_API_KEY not found in .env file.")
@@ -51,19 +71,36 @@ if not OPENROUTER_API_KEY:
 
 # --- 2. HELPER FUNCTIONS (The Core Machinery) ---
 
-def extract_text_from_pdf(pdf_path):
-    """Opens and reads the text from a PDF file."""
-    if not os.path.exists(pdf_path):
-        return "Error: PDF file not found."
+def extract_pages_from_pdf(pdf_path, backend=None, tracker=None):
+    """
+    Reads the text of every page of a PDF (empty pages included, so indexes match the slides).
+    backend picks the extractor (pdfplumber, pdfminer, pypdfium2); defaults to PDF_EXTRACTOR or pdfplumber.
+    With a memory tracker, a backend that runs over the extraction budget is swapped for the lightest one.
+    """
+    backend = backend or os.getenv('PDF_EXTRACTOR', pdf_extractors.DEFAULT_EXTRACTOR)
     print(f"Reading text from {pdf_path}...")
-    with pdfplumber.open(pdf_path) as pdf:
-        full_text = ""
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                full_text += page_text + "\n"
+    page_texts = []
+    try:
+        for page_text in pdf_extractors.iter_pdf_pages(pdf_path, backend):
+            page_texts.append(page_text or "")
+            if tracker:
+                tracker.check()
+    except memory_budget.MemoryBudgetExceeded as e:
+        lighter = pdf_extractors.low_memory_extractor()
+        if backend == lighter:
+            raise
+        del page_texts
+        print(f"⚠️ {e}")
+        tracker.degrade(f"{backend} over budget, re-extracted with {lighter}")
+        return extract_pages_from_pdf(pdf_path, lighter, tracker)
     print("Text extraction complete.")
-    return full_text
+    return page_texts
+
+def extract_text_from_pdf(pdf_path, backend=None, tracker=None):
+    """Opens and reads the text from a PDF file (see extract_pages_from_pdf)."""
+    if not os.path.exists(pdf_path):
+        return "Error: PDF file not found."
+    return incremental_update.pages_to_text(extract_pages_from_pdf(pdf_path, backend, tracker))
 
 import time
 
@@ -75,7 +112,10 @@ def generate_ai_response(api_key, prompt):
     max_retries = 3
     retry_delay = 10  # seconds
     
-    genai.configure(api_key=api_key)
+    if GEMINI_API_ENDPOINT:
+        genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+    else:
+        genai.configure(api_key=api_key)
     
     # Set up safe settings to avoid blocking academic content
     safety_settings = [
@@ -264,6 +304,36 @@ Requirements:
 5. Do not include any markdown formatting (like ```json ... ```) in the output, just the raw JSON string.
 """
 
+PHASE_1_UPDATE_PROMPT = """
+Act as a Senior Professor & Curriculum Designer. Some slides of a lecture were revised.
+Update ONLY the Concept blocks below from an existing **Lecture Architecture Guide** so they match the revised source text.
+
+RULES:
+1. Keep the exact block format:
+### Concept: [Name]
+- **Core Logic:** A 2-sentence high-level explanation.
+- **"Make it Click" Analogy:** A ==highlighted analogy== to ground the concept.
+- **Deep Dive:** 3-5 technical nuances in **bold**.
+- **Engagement:** One specific question to check for understanding.
+2. Keep a block's name unless its topic changed. Drop a block the revised text no longer supports.
+3. Add a new block for any key concept in the revised text that none of the blocks covers.
+4. Output ONLY the ### Concept blocks, nothing else. Output nothing if no block is needed.
+
+STRICT FORMATTING RULES:
+1. Wrap ALL formulas, math variables, or technical notation in $ ... $ (e.g. $O(n)$, $E=mc^2$).
+2. Wrap ALL analogies in == ... == (e.g. ==Just like a pizza...==).
+
+EXISTING BLOCKS:
+---
+{existing_blocks}
+---
+
+REVISED SOURCE TEXT:
+---
+{input_text}
+---
+"""
+
 # --- 4. THE MAIN ASSEMBLY LINE (UPGRADED) ---
 
 def find_pdf_in_folder():
@@ -316,79 +386,305 @@ def clean_and_parse_json(raw_text):
     print("❌ Failed to parse script even with regex.")
     return None
 
-async def run_workflow():
-    """The main function that runs the automated workflow."""
+def make_render_executor():
+    """Creates the background pool that .docx render jobs are submitted to."""
+    if RENDER_EXECUTOR == "thread":
+        return ThreadPoolExecutor(max_workers=RENDER_WORKERS)
+    try:
+        # spawn, not fork: this process already runs threads (memory sampler, watch mode, gRPC)
+        # and forking it can deadlock a worker on a lock one of them held
+        return ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    except (OSError, NotImplementedError) as e:
+        # Some sandboxes forbid the semaphores a process pool needs
+        print(f"Warning: Process pool unavailable ({e}). Rendering on threads instead.")
+        return ThreadPoolExecutor(max_workers=RENDER_WORKERS)
+
+def render_backend_for(markdown_text, tracker, render_pool):
+    """Picks the streaming .docx backend when a python-docx tree for this markdown would not fit the render budget."""
+    if os.getenv('DOC_STYLER_BACKEND') == "stream":
+        return None
+    # MEMORY_RSS_LIMIT_MB is this process's ceiling: it only applies when rendering runs on threads here
+    in_process = isinstance(render_pool, ThreadPoolExecutor)
+    if tracker.fits("render", len(markdown_text) * memory_budget.DOCX_TREE_BYTES_PER_CHAR, include_rss_limit=in_process):
+        return None
+    print(f"⚠️ [Memory] render: {len(markdown_text)} chars would not fit as a python-docx tree, using the streaming backend")
+    return "stream"
+
+def queue_render(render_pool, render_jobs, store, run_id, name, markdown_text, docx_path, tracker, title="Study Notes", unchanged=False):
+    """Submits a background .docx render for a stored phase, unless an unchanged document is already on disk."""
+    if unchanged and os.path.exists(docx_path):
+        print(f"Unchanged since the last run, keeping {docx_path}")
+        return
+    render_jobs[docx_path] = render_pool.submit(
+        artifact_store.render_docx_from_store, store.db_path, run_id, name, docx_path, title,
+        render_backend_for(markdown_text, tracker, render_pool)
+    )
+
+def reuse_previous(store, run_id, update, input_digests, phase, digest, names=()):
+    """
+    Records a phase's input digest. In an incremental run whose previous run saw the same
+    (compacted) input, copies that run's outputs for the phase and returns True (skip the phase).
+    """
+    input_digests[phase] = digest
+    if not update:
+        return False
+    previous_digests = store.get_json(update["previous_run"], artifact_store.INPUT_DIGESTS) or {}
+    if previous_digests.get(phase) != digest:
+        return False
+    if names and store.copy_artifacts(update["previous_run"], run_id, names) < len(names):
+        return False  # the previous run never produced them (e.g. synthesis failed), so run the phase
+    print(f"✅ Input unchanged since run #{update['previous_run']}: reusing its {phase} outputs.")
+    return True
+
+def regenerate_changed_concepts(store, lecture, pages):
+    """
+    Incremental Phases 1-3: diffs pages against the lecture's last complete run and regenerates only
+    the concept blocks built on changed pages, spliced into that run's outputs.
+    Returns {"previous_run", "lecture_guide", "structured_guide", "exam_notes", "previous": {...}},
+    or None when a full regeneration is needed instead.
+    """
+    previous_run = store.latest_run(lecture)
+    if not previous_run:
+        print("No previous complete run of this lecture: running every phase.")
+        return None
+    old_pages = store.get_json(previous_run, artifact_store.PAGE_TEXTS)
+    old_p1 = store.get_text(previous_run, artifact_store.PHASE1_MARKDOWN)
+    old_p2 = store.get_text(previous_run, artifact_store.PHASE2_MARKDOWN)
+    old_p3 = store.get_text(previous_run, artifact_store.PHASE3_MARKDOWN)
+    if old_pages is None or not (old_p1 and old_p2 and old_p3):
+        print(f"Run #{previous_run} has no page texts or phase notes to update: running every phase.")
+        return None
+
+    plan = incremental_update.plan_update(old_pages, pages, old_p1)
+    if plan is None:
+        print("Too many pages changed for an incremental update: running every phase.")
+        return None
+    update = {
+        "previous_run": previous_run,
+        "previous": {"lecture_guide": old_p1, "structured_guide": old_p2, "exam_notes": old_p3},
+        "lecture_guide": old_p1, "structured_guide": old_p2, "exam_notes": old_p3,
+    }
+    if not plan["changed_pages"] and not plan["affected"]:
+        print(f"No page changed since run #{previous_run}.")
+        return update
+    print(f"Pages changed since run #{previous_run}: {[p + 1 for p in plan['changed_pages']] or 'removed only'}; "
+          f"regenerating {len(plan['affected'])} concept block(s).")
+
+    # Phase 1: rewrite the affected blocks (and add blocks for brand-new material)
+    old_p1_blocks = incremental_update.concept_blocks(old_p1)
+    response = generate_ai_response(GOOGLE_API_KEY, PHASE_1_UPDATE_PROMPT.format(
+        existing_blocks="\n".join(old_p1_blocks[i] for i in plan["affected"]) or "(none)",
+        input_text=incremental_update.pages_to_text(pages[i] for i in plan["source_pages"]),
+    ))
+    if response is None:
+        return None
+    new_p1_blocks = incremental_update.concept_blocks(response)
+    # A returned block named like an existing one replaces it, even if that one was not on a changed page
+    new_names = {incremental_update.concept_name(block) for block in new_p1_blocks}
+    replaced = set(plan["affected"]) | {
+        i for i, block in enumerate(old_p1_blocks) if incremental_update.concept_name(block) in new_names
+    }
+    update["lecture_guide"] = incremental_update.splice_concepts(old_p1, replaced, new_p1_blocks)
+
+    # Phase 2: replace the old blocks that were derived from the replaced Phase 1 blocks
+    old_p2_blocks = incremental_update.concept_blocks(old_p2)
+    if not old_p2_blocks:
+        return update_in_full(update, from_phase=2)
+    stale_p2 = incremental_update.derived_from(old_p2_blocks, old_p1_blocks, replaced)
+    new_p2_blocks = []
+    if new_p1_blocks:
+        response = generate_ai_response(GOOGLE_API_KEY, PHASE_2_PROMPT.format(input_text="\n".join(new_p1_blocks)))
+        if response is None:
+            return None
+        new_p2_blocks = incremental_update.concept_blocks(response)
+    update["structured_guide"] = incremental_update.splice_concepts(old_p2, stale_p2, new_p2_blocks)
+
+    # Phase 3: drop entries derived from replaced Phase 2 blocks, add entries for the new ones
+    stale_p3 = incremental_update.derived_from(incremental_update.phase3_items(old_p3), old_p2_blocks, stale_p2)
+    fragment = ""
+    if new_p2_blocks:
+        fragment = generate_ai_response(GOOGLE_API_KEY, PHASE_3_PROMPT.format(input_text="\n".join(new_p2_blocks)))
+        if fragment is None:
+            return None
+    merged = incremental_update.merge_phase3(old_p3, fragment, stale_p3)
+    if merged is None:
+        return update_in_full(update, from_phase=3)
+    update["exam_notes"] = merged
+    return update
+
+def update_in_full(update, from_phase):
+    """Fallback when an older output cannot be spliced: regenerates it (and later phases) from the spliced input."""
+    print(f"Phase {from_phase} notes have no blocks to splice into: regenerating Phase {from_phase}-3 in full.")
+    if from_phase <= 2:
+        update["structured_guide"] = generate_ai_response(GOOGLE_API_KEY, PHASE_2_PROMPT.format(input_text=update["lecture_guide"]))
+        if update["structured_guide"] is None:
+            return None
+    update["exam_notes"] = generate_ai_response(GOOGLE_API_KEY, PHASE_3_PROMPT.format(input_text=update["structured_guide"]))
+    if update["exam_notes"] is None:
+        return None
+    return update
+
+async def collect_render_jobs(render_jobs):
+    """Awaits every background render job and reports each artifact's outcome."""
+    if not render_jobs:
+        return {}
+    print(f"\nWaiting for {len(render_jobs)} background document render(s)...")
+    results = await asyncio.gather(
+        *(asyncio.wrap_future(job) for job in render_jobs.values()),
+        return_exceptions=True
+    )
+    failures = {}
+    for path, result in zip(render_jobs, results):
+        if isinstance(result, BaseException):
+            failures[path] = result
+            print(f"❌ Render failed for {path}: {result!r}")
+        else:
+            print(f"✅ Rendered: {path}")
+    return failures
+
+async def run_workflow(pdf_file_path=None, incremental=None):
+    """
+    The main function that runs the automated workflow.
+    Processes pdf_file_path, or the first PDF in the current folder if none is given. Returns True when complete.
+    incremental (default: INCREMENTAL) updates the lecture's last complete run instead of starting from scratch.
+    """
     print("--- Main function has started. Beginning automated workflow... ---")
+
+    # Every intermediate output of this run goes into one SQLite artifact store
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    store = artifact_store.ArtifactStore(os.path.join(OUTPUT_FOLDER, artifact_store.DEFAULT_STORE_NAME))
+    run = {}
+    # Per-phase peak/retained memory, checked against MEMORY_BUDGET_MB / MEMORY_BUDGETS / MEMORY_RSS_LIMIT_MB
+    tracker = memory_budget.MemoryTracker().start()
+
+    # Phase 1-3 and 5 documents render in the background; they are awaited once at the end
+    render_pool = make_render_executor()
+    render_jobs = {}
+    completed = False
+    try:
+        completed = await run_phases(render_pool, render_jobs, store, run, tracker, pdf_file_path,
+                                     INCREMENTAL if incremental is None else incremental)
+    except MemoryError as e:
+        # Over budget with no low-memory path left: stop cleanly instead of being OOM-killed
+        print(f"\n❌ Memory budget exceeded: {e}. Stopping this run.")
+    finally:
+        failures = await collect_render_jobs(render_jobs)
+        render_pool.shutdown()
+        tracker.stop()
+        print("\n--- Memory per Phase ---")
+        print(tracker.report())
+        if run.get("id"):
+            store.put(run["id"], artifact_store.MEMORY_REPORT, tracker.as_dicts())
+            store.finish_run(run["id"], "complete" if completed and not failures else "failed")
+        store.close()
+    return completed and not failures
+
+async def run_phases(render_pool, render_jobs, store, run, tracker, pdf_file_path=None, incremental=False):
+    """
+    Runs Phases 1-8, submitting .docx renders to render_pool (keyed by output path in render_jobs).
+    Outputs are recorded in store under a new run (its id is set in run["id"]), and each phase's
+    memory in tracker. When incremental, Phases 1-3 only regenerate concepts on changed pages and
+    later phases whose input did not change reuse the previous run's outputs. Returns True when complete.
+    """
     
-    # NEW: Debugging info
-    print(f"Current Working Directory: {os.getcwd()}")
-    print(f"Files in current folder: {os.listdir('.')}")
+    if not pdf_file_path:
+        # NEW: Debugging info
+        print(f"Current Working Directory: {os.getcwd()}")
+        print(f"Files in current folder: {os.listdir('.')}")
     
-    # NEW: Automatically find the PDF instead of using a hardcoded path
-    pdf_file_path = find_pdf_in_folder()
+        # NEW: Automatically find the PDF instead of using a hardcoded path
+        pdf_file_path = find_pdf_in_folder()
     if not pdf_file_path:
         print("\n❌ ERROR: No PDF file found in this folder.")
         print("Please add a PDF to this folder and run the script again.")
-        return
+        return False
 
-    # NEW: Define the output folder and create it if it doesn't exist
-    output_folder = "Final_Notes"
-    os.makedirs(output_folder, exist_ok=True)
+    output_folder = OUTPUT_FOLDER
     print(f"Output will be saved in the '{output_folder}' folder.")
     
     base_filename = os.path.splitext(os.path.basename(pdf_file_path))[0]
+    run_id = run["id"] = store.start_run(base_filename, pdf_file_path)
+    store.put(run_id, artifact_store.METADATA, {
+        "pdf": pdf_file_path,
+        "lecture": base_filename,
+        "pdf_extractor": os.getenv('PDF_EXTRACTOR', pdf_extractors.DEFAULT_EXTRACTOR),
+    })
     
-    pdf_text = extract_text_from_pdf(pdf_file_path)
-    if pdf_text and "Error" in pdf_text and len(pdf_text) < 100: # Simple check for the file-not-found error string from helper
-        print(pdf_text)
-        return
+    tracker.begin("extract")
+    if not os.path.exists(pdf_file_path):
+        print("Error: PDF file not found.")
+        return False
+    pages = extract_pages_from_pdf(pdf_file_path, tracker=tracker)
+    pdf_text = incremental_update.pages_to_text(pages)
+    store.put(run_id, artifact_store.EXTRACTED_TEXT, pdf_text)
+    store.put(run_id, artifact_store.PAGE_TEXTS, pages)
+    input_digests = {}
 
     # --- PHASE 1 ---
     print("\n[Phase 1] Generating Lecture Guide...")
-    lecture_guide = generate_ai_response(GOOGLE_API_KEY, PHASE_1_PROMPT.format(input_text=pdf_text))
+    tracker.begin("phase1")
+    # Incremental: only concepts built on changed pages go back through Phases 1-3
+    update = regenerate_changed_concepts(store, base_filename, pages) if incremental else None
+    if update:
+        lecture_guide = update["lecture_guide"]
+    else:
+        lecture_guide = generate_ai_response(GOOGLE_API_KEY, PHASE_1_PROMPT.format(input_text=pdf_text))
+    del pdf_text, pages  # kept in the store; the full text is the largest string of the run
     if lecture_guide:
         print("✅ Connection to Google AI successful!")
         filename_p1 = f"{base_filename}_Phase1_Lecture_Guide"
         # Use Universal Styling Engine
         docx_path = os.path.join(output_folder, f"{filename_p1}.docx")
-        doc_styler.create_styled_docx(lecture_guide, docx_path)
+        store.put(run_id, artifact_store.PHASE1_MARKDOWN, lecture_guide)
+        queue_render(render_pool, render_jobs, store, run_id, artifact_store.PHASE1_MARKDOWN, lecture_guide, docx_path, tracker,
+                     unchanged=bool(update) and lecture_guide == update["previous"]["lecture_guide"])
         # No temp md file needed for pypandoc anymore, so we don't save/delete md
 
     else:
         print(f"\n❌ Connection to Google AI failed. Check logs for details.")
-        return
+        return False
 
     # --- PHASE 2 ---
     print("\n[Phase 2] Applying Core Recipe...")
-    structured_guide = generate_ai_response(GOOGLE_API_KEY, PHASE_2_PROMPT.format(input_text=lecture_guide))
+    tracker.begin("phase2")
+    if update:
+        structured_guide = update["structured_guide"]
+    else:
+        structured_guide = generate_ai_response(GOOGLE_API_KEY, PHASE_2_PROMPT.format(input_text=lecture_guide))
     if structured_guide:
         filename_p2 = f"{base_filename}_Phase2_Structured_Guide"
         # Use Universal Styling Engine
         docx_path = os.path.join(output_folder, f"{filename_p2}.docx")
-        doc_styler.create_styled_docx(structured_guide, docx_path)
+        store.put(run_id, artifact_store.PHASE2_MARKDOWN, structured_guide)
+        queue_render(render_pool, render_jobs, store, run_id, artifact_store.PHASE2_MARKDOWN, structured_guide, docx_path, tracker,
+                     unchanged=bool(update) and structured_guide == update["previous"]["structured_guide"])
 
     else:
         print("Failed to generate Phase 2 output.")
-        return
+        return False
 
     # --- PHASE 3 ---
     print("\n[Phase 3] Distilling Exam Prep Notes...")
-    exam_notes = generate_ai_response(GOOGLE_API_KEY, PHASE_3_PROMPT.format(input_text=structured_guide))
+    tracker.begin("phase3")
+    if update:
+        exam_notes = update["exam_notes"]
+    else:
+        exam_notes = generate_ai_response(GOOGLE_API_KEY, PHASE_3_PROMPT.format(input_text=structured_guide))
     if exam_notes:
         filename_p3 = f"{base_filename}_Phase3_Exam_Prep_Notes"
         # Use Universal Styling Engine
         docx_path = os.path.join(output_folder, f"{filename_p3}.docx")
-        doc_styler.create_styled_docx(exam_notes, docx_path)
+        store.put(run_id, artifact_store.PHASE3_MARKDOWN, exam_notes)
+        queue_render(render_pool, render_jobs, store, run_id, artifact_store.PHASE3_MARKDOWN, exam_notes, docx_path, tracker,
+                     unchanged=bool(update) and exam_notes == update["previous"]["exam_notes"])
 
     else:
         print("Failed to generate Phase 3 output.")
-        return
+        return False
         
     # --- PHASE 4: AUDIO OVERVIEW ---
     print("\n[Phase 4] Generating Audio Overview...")
-    
-    # 1. Generate Script
-    print("Generating Podcast Script...")
+    tracker.begin("phase4")
     
     # Combine content from all phases for maximum context
     combined_context = f"""
@@ -402,47 +698,63 @@ async def run_workflow():
     {exam_notes}
     """
     
-    # NOTE: Using combined context (Phase 1-3) 
-    raw_script_response = generate_podcast_script(combined_context, OPENROUTER_API_KEY)
-    
-    if raw_script_response:
-        script_data = clean_and_parse_json(raw_script_response)
-        
-        if script_data:
-            script_filename = "podcast_script.json"
-            script_path = os.path.join(output_folder, script_filename)
+    # Named per lecture: watch mode runs several lectures into the same folder at once
+    script_path = os.path.join(output_folder, f"{base_filename}_podcast_script.json")
+    audio_path = os.path.join(output_folder, f"{base_filename}_audio_overview.mp3")
+    if reuse_previous(store, run_id, update, input_digests, "phase4", incremental_update.input_digest(combined_context),
+                      [artifact_store.PODCAST_SCRIPT, artifact_store.AUDIO_OVERVIEW]):
+        del combined_context
+        store.materialize(run_id, artifact_store.PODCAST_SCRIPT, script_path)
+        store.materialize(run_id, artifact_store.AUDIO_OVERVIEW, audio_path)
+    else:
+        # 1. Generate Script
+        print("Generating Podcast Script...")
+        # NOTE: Using combined context (Phase 1-3) 
+        raw_script_response = generate_podcast_script(combined_context, OPENROUTER_API_KEY)
+        del combined_context
         
-            with open(script_path, 'w', encoding='utf-8') as f:
-                json.dump(script_data, f, indent=2)
-            print(f"Script saved to {script_path}")
+        if raw_script_response:
+            script_data = clean_and_parse_json(raw_script_response)
             
+            if script_data:
+                store.put(run_id, artifact_store.PODCAST_SCRIPT, json.dumps(script_data, indent=2))
+                store.materialize(run_id, artifact_store.PODCAST_SCRIPT, script_path)
+                
+                # 2. Synthesize Audio
+                # Low-memory path: stream the MP3 to disk (up front if the estimate does not fit,
+                # or as soon as the phase runs over budget) instead of holding the whole track
+                words = sum(len(str(entry.get("text", "")).split()) for entry in script_data)
+                spool = not tracker.fits("phase4", words * memory_budget.MP3_BYTES_PER_WORD)
+                if spool:
+                    tracker.degrade(f"MP3 for ~{words} words over budget, streamed to disk")
 
-            
-            # 2. Synthesize Audio
-            audio_filename = "audio_overview.mp3" # Requested name: audio_overview.mp3
-            audio_path = os.path.join(output_folder, audio_filename)
-            
-            # Verify we are passing the output path correctly
-            print(f"Synthesizing audio to: {audio_path}")
-            await audio_generator.synthesize_audio(script_path, audio_path)
+                def memory_tight():
+                    if tracker.fits("phase4", 0):
+                        return False
+                    tracker.degrade("over budget mid-synthesis, streamed rest of MP3 to disk")
+                    return True
+
+                audio_bytes = await audio_generator.synthesize_script_audio(script_data, audio_path, spool=spool, spool_if=memory_tight)
+                if audio_bytes is None:  # spooled: the MP3 is only on disk
+                    store.put_file(run_id, artifact_store.AUDIO_OVERVIEW, audio_path)
+                elif audio_bytes:
+                    store.put(run_id, artifact_store.AUDIO_OVERVIEW, audio_bytes)
+                    del audio_bytes
+            else:
+                print(f"Error: Failed to parse generated script as JSON details.\nRaw output:\n{raw_script_response}")
         else:
-            print(f"Error: Failed to parse generated script as JSON details.\nRaw output:\n{raw_script_response}")
-    else:
-        print("Skipping Audio Phase: Script generation failed or returned empty.")
+            print("Skipping Audio Phase: Script generation failed or returned empty.")
 
     
     print("\n[Phase 5] Distilling Feynman Mastery...")
+    tracker.begin("phase5")
     
-    # Harvest Phase 4 Text for Context
+    # Harvest Phase 4 Text for Context (straight from the store, no file round-trip)
     podcast_text_content = ""
-    if os.path.exists(os.path.join(output_folder, "podcast_script.json")):
-        try:
-            with open(os.path.join(output_folder, "podcast_script.json"), 'r') as f:
-                script_data = json.load(f)
-                # Combine all dialogue into one text block
-                podcast_text_content = "\n".join([f"{entry.get('speaker', 'Unknown')}: {entry.get('text', '')}" for entry in script_data])
-        except Exception as e:
-            print(f"Warning: Could not read podcast script for context: {e}")
+    script_data = store.get_json(run_id, artifact_store.PODCAST_SCRIPT)
+    if script_data:
+        # Combine all dialogue into one text block
+        podcast_text_content = "\n".join([f"{entry.get('speaker', 'Unknown')}: {entry.get('text', '')}" for entry in script_data])
     else:
         print("Warning: Podcast script not found. Proceeding with Phase 1-3 context only.")
 
@@ -462,26 +774,101 @@ async def run_workflow():
     feynman_path = os.path.join(output_folder, feynman_filename)
     
     
-    feynman_generator.generate_feynman_doc(master_study_context, OPENROUTER_API_KEY, feynman_path)
-    print(f"✅ Phase 5 Mastery Page Saved: {feynman_path}")
+    master_digest = incremental_update.input_digest(master_study_context)
+    if reuse_previous(store, run_id, update, input_digests, "phase5", master_digest, [artifact_store.PHASE5_MARKDOWN]):
+        feynman_notes = store.get_text(run_id, artifact_store.PHASE5_MARKDOWN)
+        queue_render(render_pool, render_jobs, store, run_id, artifact_store.PHASE5_MARKDOWN, feynman_notes, feynman_path, tracker,
+                     "Feynman Mastery", unchanged=True)
+    else:
+        feynman_notes = feynman_generator.generate_feynman_markdown(master_study_context, OPENROUTER_API_KEY)
+        if feynman_notes:
+            store.put(run_id, artifact_store.PHASE5_MARKDOWN, feynman_notes)
+            queue_render(render_pool, render_jobs, store, run_id, artifact_store.PHASE5_MARKDOWN, feynman_notes, feynman_path, tracker, "Feynman Mastery")
+            print(f"Phase 5 Mastery Page queued for rendering: {feynman_path}")
+            feynman_generator.print_analogy(feynman_notes)
+
+    # Phase 8 groundwork: a local BM25 index so Q&A only sends the relevant blocks
+    tracker.begin("index")
+    index_dir = os.path.join(output_folder, f"{base_filename}_QA_Index")
+    index_sources = {
+        "Phase 1: Lecture Guide": lecture_guide,
+        "Phase 2: Structured Guide": structured_guide,
+        "Phase 3: Exam Notes": exam_notes,
+        "Phase 5: Feynman": feynman_notes,
+    }
+    index_digest = incremental_update.input_digest(*index_sources.values())
+    if not reuse_previous(store, run_id, update, input_digests, "index", index_digest) or not os.path.isdir(index_dir):
+        try:
+            qa_index.build_study_index(index_sources, index_dir)
+        except Exception as e:
+            print(f"❌ Q&A Index Build Failed: {e}")
+
     print("\n[Phase 6] Generating Universal Visualizer Infographic...")
-    infographic_filename = "Phase6_Infographic.png"
+    tracker.begin("phase6")
+    infographic_filename = f"{base_filename}_Phase6_Infographic.png"
     infographic_path = os.path.join(output_folder, infographic_filename)
     
     # We use the same master context, which prioritizes P2 via the header label we added above
-    doc_visualizer.generate_mindmap_png(master_study_context, OPENROUTER_API_KEY, infographic_path)
+    if reuse_previous(store, run_id, update, input_digests, "phase6", master_digest,
+                      [artifact_store.MERMAID_CODE, artifact_store.INFOGRAPHIC]):
+        store.materialize(run_id, artifact_store.INFOGRAPHIC, infographic_path)
+    else:
+        mermaid_code = doc_visualizer.generate_mermaid_code(master_study_context, OPENROUTER_API_KEY)
+        if mermaid_code:
+            store.put(run_id, artifact_store.MERMAID_CODE, mermaid_code)
+            png_bytes = doc_visualizer.render_mermaid_png(mermaid_code)
+            if png_bytes:
+                store.put(run_id, artifact_store.INFOGRAPHIC, png_bytes)
+                store.materialize(run_id, artifact_store.INFOGRAPHIC, infographic_path)
+
+    print("\n[Phase 7] Exporting Anki Flashcards...")
+    tracker.begin("phase7")
+    # One shared deck per output folder; cards already in it (by content hash) are skipped
+    deck_path = os.path.join(output_folder, "Study_Deck.apkg")
+    if not reuse_previous(store, run_id, update, input_digests, "phase7", incremental_update.input_digest(exam_notes)):
+        try:
+            anki_exporter.export_phase3_notes(exam_notes, deck_path, lecture_name=base_filename)
+        except Exception as e:
+            print(f"❌ Anki Export Failed: {e}")
 
+    store.put(run_id, artifact_store.INPUT_DIGESTS, input_digests)
+    tracker.check()
+    tracker.end()
     print("\n--- AUTOMATED WORKFLOW COMPLETE ---")
+    return True
+
+async def watch_folder(input_dir, incremental=None):
+    """Watch mode: runs the workflow for every new or changed PDF dropped into input_dir."""
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+
+    async def process(pdf_path):
+        # Phases block on their API calls, so each lecture gets its own thread and event loop
+        return await asyncio.to_thread(asyncio.run, run_workflow(pdf_path, incremental))
+
+    watcher = pdf_watcher.PdfWatcher(
+        input_dir,
+        os.path.join(OUTPUT_FOLDER, pdf_watcher.DEFAULT_STATE_NAME),
+        process,
+        max_concurrency=WATCH_CONCURRENCY,
+    )
+    await watcher.run()
 
 def main():
-    asyncio.run(run_workflow())
+    # --incremental: re-uploaded lectures only regenerate what their changed pages touch
+    incremental = True if "--incremental" in sys.argv else None
+    args = [arg for arg in sys.argv[1:] if arg not in ("--watch", "--incremental")]
+    if "--watch" in sys.argv:
+        try:
+            asyncio.run(watch_folder(args[0] if args else '.', incremental))
+        except KeyboardInterrupt:
+            print("\nWatch mode stopped.")
+    else:
+        asyncio.run(run_workflow(args[0] if args else None, incremental))
 
 # --- 5. PHASE 4 - THE SPECIALIST TOOLKIT ---
 # (This section remains the same, to be used manually)
-def expand_on_detail(text_to_expand, api_key):
-    """(Phase 4 Tool) Uses the AI to expand on a specific piece of text."""
-    print("\n--- Using the Detail Expander Tool ---")
-    prompt = f"""
+def expand_prompt(text_to_expand):
+    return f"""
     Expand on the selected text and make it longer by 25-50% by elaborating on existing ideas, providing more examples, and/or fleshing out an idea in more detail. Focus on enhancing and adding depth to existing topics instead of introducing new concepts. The added content should still flow well with the surrounding text.
 
     Here is the text to expand upon:
@@ -489,12 +876,9 @@ def expand_on_detail(text_to_expand, api_key):
     {text_to_expand}
     ---
     """
-    return generate_ai_response(api_key, prompt)
 
-def ensure_source_accuracy(code_to_check, source_material_context, api_key):
-    """(Phase 4 Tool) Asks the AI to rewrite code based on source material."""
-    print("\n--- Using the Source Accuracy Tool ---")
-    prompt = f"""
+def source_accuracy_prompt(code_to_check, source_material_context):
+    return f"""
     Please analyze the following pseudocode. Your task is to rewrite it so it *explicitly* matches the logic implied in the provided source material context. After the code block, provide a separate, clear explanation of the code's logic, step-by-step, instead of using inline comments.
 
     Source Material Context: "{source_material_context}"
@@ -504,7 +888,142 @@ def ensure_source_accuracy(code_to_check, source_material_context, api_key):
     {code_to_check}
     ---
     """
-    return generate_ai_response(api_key, prompt)
+
+def expand_on_detail(text_to_expand, api_key):
+    """(Phase 4 Tool) Uses the AI to expand on a specific piece of text."""
+    print("\n--- Using the Detail Expander Tool ---")
+    return generate_ai_response(api_key, expand_prompt(text_to_expand))
+
+def ensure_source_accuracy(code_to_check, source_material_context, api_key):
+    """(Phase 4 Tool) Asks the AI to rewrite code based on source material."""
+    print("\n--- Using the Source Accuracy Tool ---")
+    return generate_ai_response(api_key, source_accuracy_prompt(code_to_check, source_material_context))
+
+# --- Batch variants ---
+# Each item runs generate_ai_response in a worker thread, at most TOOLKIT_CONCURRENCY at a time.
+# Results come back in input order as dicts:
+#   {"index", "input", "output", "status": "ok" | "cached" | "failed", "seconds", "error", "key"}
+# Successful responses are cached by tool + prompt ("key"), so running the same batch again (or passing
+# previous=results) only sends the failed items. A previous result is only reused for an item with the same key.
+TOOLKIT_CONCURRENCY = int(os.getenv('TOOLKIT_CONCURRENCY', "4"))
+TOOLKIT_CACHE = {}
+CODE_FENCE = re.compile(r'^\s*(```|~~~)\s*([\w+#.-]*)')
+
+def extract_code_blocks(markdown_text):
+    """
+    Every fenced code block of a (Phase 2) markdown document, in order, as
+    {"code", "language", "heading", "context"}: the heading is the nearest one above the block,
+    the context is that section's prose (the block's own spec and explanation).
+    """
+    blocks = []
+    heading, section, fence, code, language = "", [], None, [], ""
+    section_blocks = []
+
+    def close_section():
+        context = "".join(section).strip()
+        for block in section_blocks:
+            block["context"] = context
+        section_blocks.clear()
+
+    for line in markdown_text.splitlines(keepends=True):
+        if fence:
+            if line.strip().startswith(fence):
+                block = {"code": "".join(code).rstrip("\n"), "language": language, "heading": heading, "context": ""}
+                blocks.append(block)
+                section_blocks.append(block)
+                fence = None
+            else:
+                code.append(line)
+            continue
+        opened = CODE_FENCE.match(line)
+        if opened:
+            fence, language, code = opened.group(1), opened.group(2), []
+        elif incremental_update.HEADING.match(line):
+            close_section()
+            heading, section = line.strip().lstrip("#").strip(), [line]
+        else:
+            section.append(line)
+    close_section()
+    return blocks
+
+async def run_toolkit_batch(tool, prompts, inputs, api_key, max_concurrency=None, cache=None, previous=None):
+    """Sends every prompt concurrently (bounded) and returns one result dict per prompt, in order."""
+    cache = TOOLKIT_CACHE if cache is None else cache
+    semaphore = asyncio.Semaphore(max_concurrency or TOOLKIT_CONCURRENCY)
+    kept = {r["key"]: r for r in (previous or []) if r["status"] != "failed" and r.get("key")}
+
+    in_flight = {}  # identical prompts within the batch share one request
+
+    async def fetch(key, prompt):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                output = await asyncio.to_thread(generate_ai_response, api_key, prompt)
+                error = None if output else "No response from AI"
+            except Exception as e:
+                output, error = None, repr(e)
+            if output:
+                cache[key] = output
+            return output, error, round(time.perf_counter() - start, 2)
+
+    async def run_one(index, prompt):
+        key = hashlib.sha256(f"{tool}\x00{prompt}".encode('utf-8')).hexdigest()
+        result = {"index": index, "input": inputs[index], "output": None, "status": "failed", "seconds": 0.0, "error": None, "key": key}
+        if key in kept or key in cache:
+            output = kept[key]["output"] if key in kept else cache[key]
+            result.update(output=output, status="cached")
+            return result
+        if key in in_flight:
+            output, error, _ = await in_flight[key]
+            result.update(output=output, status="cached" if output else "failed", error=error)
+            return result
+        in_flight[key] = asyncio.ensure_future(fetch(key, prompt))
+        output, error, seconds = await in_flight[key]
+        result.update(output=output, status="ok" if output else "failed", error=error, seconds=seconds)
+        return result
+
+    print(f"\n--- Batch {tool}: {len(prompts)} item(s), up to {max_concurrency or TOOLKIT_CONCURRENCY} at a time ---")
+    results = await asyncio.gather(*(run_one(i, prompt) for i, prompt in enumerate(prompts)))
+    failed = [r["index"] for r in results if r["status"] == "failed"]
+    cached = sum(1 for r in results if r["status"] == "cached")
+    if failed:
+        print(f"⚠️ {len(results) - len(failed)}/{len(results)} done ({cached} cached)")
+        print(f"❌ Failed items: {failed} (run the batch again with previous=results to retry only these)")
+    else:
+        print(f"✅ {len(results)}/{len(results)} done ({cached} cached)")
+    return list(results)
+
+async def expand_on_detail_batch(snippets=None, api_key=GOOGLE_API_KEY, markdown_text=None, **options):
+    """
+    (Phase 4 Tool) expand_on_detail for many snippets at once.
+    Pass snippets (a list of strings), or markdown_text to expand every code block in it.
+    options: max_concurrency, cache, previous (see run_toolkit_batch).
+    """
+    if snippets is None:
+        snippets = [block["code"] for block in extract_code_blocks(markdown_text or "")]
+    return await run_toolkit_batch("expand_on_detail", [expand_prompt(s) for s in snippets], snippets, api_key, **options)
+
+async def ensure_source_accuracy_batch(snippets=None, source_material_context=None, api_key=GOOGLE_API_KEY, markdown_text=None, **options):
+    """
+    (Phase 4 Tool) ensure_source_accuracy for many code snippets at once.
+    Pass snippets, or markdown_text (e.g. a Phase 2 guide) to check every code block in it.
+    source_material_context is one string for all items or a list with one per item; left as None,
+    blocks pulled from markdown_text are checked against the section they appear in.
+    options: max_concurrency, cache, previous (see run_toolkit_batch).
+    """
+    if snippets is None:
+        blocks = extract_code_blocks(markdown_text or "")
+        snippets = [block["code"] for block in blocks]
+        if source_material_context is None:
+            source_material_context = [block["context"] for block in blocks]
+    if isinstance(source_material_context, (list, tuple)):
+        if len(source_material_context) != len(snippets):
+            raise ValueError("source_material_context needs one entry per snippet.")
+        contexts = list(source_material_context)
+    else:
+        contexts = [source_material_context or ""] * len(snippets)
+    prompts = [source_accuracy_prompt(code, context) for code, context in zip(snippets, contexts)]
+    return await run_toolkit_batch("ensure_source_accuracy", prompts, snippets, api_key, **options)
 
 # --- 6. SCRIPT IGNITION ---
 if __name__ == "__main__":
@@ -0,0 +1,338 @@
+import os
+import re
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import zipfile
+import tempfile
+import threading
+
+# Phase 7: Turns Phase 3 Exam Prep Notes into an Anki deck (.apkg).
+# An .apkg is a zip holding a SQLite collection ("collection.anki2") and a media map.
+# Cards are keyed by a content hash, so re-exporting a lecture (or a whole course)
+# only appends cards the deck does not already have.
+
+DEFAULT_DECK_NAME = "AI Study Agent"
+COLLECTION_NAME = "collection.anki2"
+
+# Sections of the Phase 3 prompt that become cards
+DEFINITIONS_SECTION = "key definitions"
+QUESTIONS_SECTION = "potential exam questions"
+# Every Phase 3 section title, so a bolded "1. **Cheat Sheet:**" line ends the previous section
+PHASE3_SECTIONS = (DEFINITIONS_SECTION, "cheat sheet", "deep dive", QUESTIONS_SECTION)
+
+APKG_SCHEMA = """
+CREATE TABLE col (
+    id integer primary key, crt integer not null, mod integer not null, scm integer not null,
+    ver integer not null, dty integer not null, usn integer not null, ls integer not null,
+    conf text not null, models text not null, decks text not null, dconf text not null, tags text not null
+);
+CREATE TABLE notes (
+    id integer primary key, guid text not null, mid integer not null, mod integer not null,
+    usn integer not null, tags text not null, flds text not null, sfld integer not null,
+    csum integer not null, flags integer not null, data text not null
+);
+CREATE TABLE cards (
+    id integer primary key, nid integer not null, did integer not null, ord integer not null,
+    mod integer not null, usn integer not null, type integer not null, queue integer not null,
+    due integer not null, ivl integer not null, factor integer not null, reps integer not null,
+    lapses integer not null, left integer not null, odue integer not null, odid integer not null,
+    flags integer not null, data text not null
+);
+CREATE TABLE revlog (
+    id integer primary key, cid integer not null, usn integer not null, ease integer not null,
+    ivl integer not null, lastIvl integer not null, factor integer not null, time integer not null,
+    type integer not null
+);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+CREATE INDEX ix_notes_usn on notes (usn);
+CREATE INDEX ix_cards_usn on cards (usn);
+CREATE INDEX ix_revlog_usn on revlog (usn);
+CREATE INDEX ix_cards_nid on cards (nid);
+CREATE INDEX ix_cards_sched on cards (did, queue, due);
+CREATE INDEX ix_revlog_cid on revlog (cid);
+CREATE INDEX ix_notes_csum on notes (csum);
+"""
+
+# Lectures processed concurrently (watch mode) append to the same deck file
+_DECK_LOCK = threading.Lock()
+
+CARD_CSS = """.card { font-family: Arial; font-size: 20px; text-align: left; color: black; background-color: white; }
+mark { background-color: #00ff00; }"""
+
+
+# --- 1. PARSING (Markdown -> Card Records) ---
+
+def _strip_markup(text):
+    """Removes the Study Agent's inline markers (**, ==, __) from a term."""
+    return re.sub(r'\*\*|==|__', '', text).strip(" *:-")
+
+def markdown_to_card_html(text):
+    """Converts the inline styling rules of the prompts into Anki-friendly HTML."""
+    text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    text = re.sub(r'\$(.+?)\$', r'\\(\1\\)', text)          # MathJax
+    text = re.sub(r'\*\*(.+?)\*\*', r'<b>\1</b>', text)
+    text = re.sub(r'==(.+?)==', r'<mark>\1</mark>', text)
+    text = re.sub(r'__(.+?)__', r'<u>\1</u>', text)
+    return text
+
+def _section_of(line):
+    """
+    Returns (section, rest) if the line opens a Phase 3 section, else None.
+    section is '' for sections that do not become cards; rest is any text after the title.
+    """
+    lowered = line.lower()
+    if line.startswith('#'):
+        rest = ''
+    elif re.match(r'^(\d+\.|[IVX]+\.)?\s*\*\*', line) and any(name in lowered.split('**')[1] for name in PHASE3_SECTIONS):
+        # "4. **Potential Exam Questions:** - Question: ..." keeps going on the same line
+        rest = re.sub(r'^[^*]*\*\*[^*]*\*\*\s*:?\s*', '', line)
+    else:
+        return None
+    if DEFINITIONS_SECTION in lowered:
+        return DEFINITIONS_SECTION, rest
+    if QUESTIONS_SECTION in lowered:
+        return QUESTIONS_SECTION, rest
+    return '', rest
+
+def _split_definition(text):
+    """Splits '**Term:** meaning' / '==Term== - meaning' into (term, meaning)."""
+    match = re.match(r'^(.+?)(?::\s*\*\*|\*\*:|:|\s+[-–—]\s+)(.+)$', text)
+    if not match:
+        return None
+    term, meaning = _strip_markup(match.group(1)), match.group(2).strip(" *")
+    if not term or not meaning:
+        return None
+    return term, meaning
+
+def parse_phase3_cards(markdown_text, lecture_name=""):
+    """
+    Parses Phase 3 Exam Prep Notes once into card records:
+    [{"front": ..., "back": ..., "tags": [...]}, ...]
+    Cards come from the "Key Definitions" and "Potential Exam Questions" sections.
+    """
+    cards = []
+    section = ''
+    question, answer = None, None  # answer stays None until an "Answer:" line is seen
+    lecture_tag = re.sub(r'\W+', '_', lecture_name).strip('_')
+
+    def flush_question():
+        if question and answer:
+            cards.append({
+                "front": markdown_to_card_html(question),
+                "back": "<br>".join(markdown_to_card_html(a) for a in answer),
+                "tags": [t for t in ("exam_question", lecture_tag) if t],
+            })
+
+    for line in markdown_text.split('\n'):
+        stripped = line.strip()
+        if not stripped:
+            continue
+
+        opened = _section_of(stripped)
+        if opened is not None:
+            flush_question()
+            question, answer = None, None
+            section, stripped = opened[0], opened[1].strip()
+            if not stripped:
+                continue
+
+        body = re.sub(r'^([-*+]|\d+\.)\s+', '', stripped)
+
+        if section == DEFINITIONS_SECTION:
+            pair = _split_definition(body)
+            if pair:
+                cards.append({
+                    "front": markdown_to_card_html(pair[0]),
+                    "back": markdown_to_card_html(pair[1]),
+                    "tags": [t for t in ("definition", lecture_tag) if t],
+                })
+
+        elif section == QUESTIONS_SECTION:
+            q_match = re.match(r'^\**\s*Question\s*\**\s*:\s*\**\s*(.+)$', body, re.IGNORECASE)
+            a_match = re.match(r'^\**\s*Answer\s*\**\s*:\s*\**\s*(.*)$', body, re.IGNORECASE)
+            if q_match:
+                flush_question()
+                question, answer = q_match.group(1).strip(), None
+            elif a_match and question:
+                answer = [a_match.group(1).strip()] if a_match.group(1).strip() else []
+            elif question and answer is not None:
+                # Continuation lines ("Step 2: ...") belong to the current answer
+                answer.append(body)
+
+    flush_question()
+    return cards
+
+def card_guid(card):
+    """Content hash identifying a card across lectures and runs."""
+    normalized = re.sub(r'\s+', ' ', f"{card['front']}\x1f{card['back']}").strip().lower()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+# --- 2. WRITING (Card Records -> .apkg) ---
+
+def _stable_id(name, salt):
+    """Deterministic model/deck id, so appends always target the same deck."""
+    return int(hashlib.sha1(f"{salt}:{name}".encode('utf-8')).hexdigest()[:12], 16) % (1 << 40) + (1 << 40)
+
+def _field_checksum(text):
+    plain = re.sub(r'<[^>]+>', '', text)
+    return int(hashlib.sha1(plain.encode('utf-8')).hexdigest()[:8], 16)
+
+DECK_TEMPLATE = {
+    "usn": -1, "lrnToday": [0, 0], "revToday": [0, 0], "newToday": [0, 0],
+    "timeToday": [0, 0], "collapsed": False, "desc": "", "dyn": 0, "conf": 1,
+    "extendNew": 10, "extendRev": 50,
+}
+
+def _model_entry(deck_name, now):
+    model_id = _stable_id(deck_name, "model")
+    return {
+        "id": model_id, "name": f"{deck_name} (Basic)", "type": 0, "mod": now, "usn": -1,
+        "sortf": 0, "did": _stable_id(deck_name, "deck"), "tags": [], "vers": [], "css": CARD_CSS,
+        "latexPre": "\\documentclass[12pt]{article}\n\\special{papersize=3in,5in}\n\\usepackage{amssymb,amsmath}\n"
+                    "\\pagestyle{empty}\n\\setlength{\\parindent}{0in}\n\\begin{document}\n",
+        "latexPost": "\\end{document}",
+        "flds": [
+            {"name": name, "ord": i, "sticky": False, "rtl": False, "font": "Arial", "size": 20, "media": []}
+            for i, name in enumerate(("Front", "Back"))
+        ],
+        "tmpls": [{
+            "name": "Card 1", "ord": 0, "did": None, "bqfmt": "", "bafmt": "",
+            "qfmt": "{{Front}}", "afmt": "{{FrontSide}}<hr id=answer>{{Back}}",
+        }],
+        "req": [[0, "all", [0]]],
+    }
+
+def _deck_entry(deck_name, now):
+    return dict(DECK_TEMPLATE, mod=now, id=_stable_id(deck_name, "deck"), name=deck_name,
+                desc="Generated by AI Study Agent (Phase 7).")
+
+def _init_collection(conn, deck_name):
+    now = int(time.time())
+    model = _model_entry(deck_name, now)
+    deck = _deck_entry(deck_name, now)
+    models = {str(model["id"]): model}
+    decks = {
+        "1": dict(DECK_TEMPLATE, mod=now, id=1, name="Default"),
+        str(deck["id"]): deck,
+    }
+    dconf = {"1": {
+        "id": 1, "name": "Default", "mod": 0, "usn": 0, "maxTaken": 60, "autoplay": True, "timer": 0,
+        "replayq": True, "dyn": False,
+        "new": {"delays": [1, 10], "ints": [1, 4, 7], "initialFactor": 2500, "order": 1, "perDay": 20, "bury": True},
+        "rev": {"perDay": 100, "ease4": 1.3, "fuzz": 0.05, "maxIvl": 36500, "ivlFct": 1, "bury": True, "minSpace": 1},
+        "lapse": {"delays": [10], "mult": 0, "minInt": 1, "leechFails": 8, "leechAction": 0},
+    }}
+    conf = {
+        "activeDecks": [1], "curDeck": 1, "newSpread": 0, "collapseTime": 1200, "timeLim": 0,
+        "estTimes": True, "dueCounts": True, "curModel": str(model["id"]), "nextPos": 1,
+        "sortType": "noteFld", "sortBackwards": False, "addToCur": True,
+    }
+
+    conn.executescript(APKG_SCHEMA)
+    conn.execute(
+        "INSERT INTO col VALUES (1, ?, ?, ?, 11, 0, 0, 0, ?, ?, ?, ?, '{}')",
+        (now, now * 1000, now * 1000, json.dumps(conf), json.dumps(models), json.dumps(decks), json.dumps(dconf)),
+    )
+
+def _ensure_deck(conn, deck_name):
+    """Adds deck_name's deck and note model to an existing collection that does not have them yet."""
+    now = int(time.time())
+    models_json, decks_json = conn.execute("SELECT models, decks FROM col").fetchone()
+    models, decks = json.loads(models_json), json.loads(decks_json)
+    model, deck = _model_entry(deck_name, now), _deck_entry(deck_name, now)
+    if str(model["id"]) in models and str(deck["id"]) in decks:
+        return
+    models.setdefault(str(model["id"]), model)
+    decks.setdefault(str(deck["id"]), deck)
+    with conn:
+        conn.execute("UPDATE col SET models = ?, decks = ?", (json.dumps(models), json.dumps(decks)))
+
+def export_apkg(cards, apkg_path, deck_name=DEFAULT_DECK_NAME):
+    """
+    Writes card records to an .apkg in one bulk transaction.
+    If apkg_path already exists, its collection is reused and only cards whose
+    content hash is not yet in the deck are appended. Returns the number added.
+    """
+    with _DECK_LOCK, tempfile.TemporaryDirectory() as tmp:
+        collection_path = os.path.join(tmp, COLLECTION_NAME)
+        is_new = not os.path.exists(apkg_path)
+        if not is_new:
+            with zipfile.ZipFile(apkg_path) as apkg, apkg.open(COLLECTION_NAME) as src, \
+                    open(collection_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+
+        conn = sqlite3.connect(collection_path)
+        try:
+            # Build-time file in a temp dir: durability is irrelevant, speed is not
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            if is_new:
+                _init_collection(conn, deck_name)
+            else:
+                _ensure_deck(conn, deck_name)
+
+            model_id = _stable_id(deck_name, "model")
+            deck_id = _stable_id(deck_name, "deck")
+            known_guids = {row[0] for row in conn.execute("SELECT guid FROM notes")}
+            next_id = max(int(time.time() * 1000),
+                          conn.execute("SELECT COALESCE(MAX(id), 0) FROM notes").fetchone()[0],
+                          conn.execute("SELECT COALESCE(MAX(id), 0) FROM cards").fetchone()[0]) + 1
+            next_due = conn.execute("SELECT COALESCE(MAX(due), 0) FROM cards WHERE type = 0").fetchone()[0] + 1
+            now = int(time.time())
+
+            note_rows, card_rows = [], []
+            for card in cards:
+                guid = card_guid(card)
+                if guid in known_guids:
+                    continue
+                known_guids.add(guid)
+                note_id, card_id = next_id, next_id + 1
+                next_id += 2
+                tags = " ".join(card.get("tags", []))
+                note_rows.append((note_id, guid, model_id, now, -1, f" {tags} " if tags else "",
+                                  f"{card['front']}\x1f{card['back']}", re.sub(r'<[^>]+>', '', card['front']),
+                                  _field_checksum(card['front']), 0, ""))
+                card_rows.append((card_id, note_id, deck_id, 0, now, -1, 0, 0, next_due,
+                                  0, 0, 0, 0, 0, 0, 0, 0, ""))
+                next_due += 1
+
+            with conn:
+                conn.executemany("INSERT INTO notes VALUES (?,?,?,?,?,?,?,?,?,?,?)", note_rows)
+                conn.executemany("INSERT INTO cards VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", card_rows)
+                conn.execute("UPDATE col SET mod = ?", (now * 1000,))
+        finally:
+            conn.close()
+
+        # Re-zip next to the target, then swap it in so a crash never leaves a half-written deck
+        partial_path = f"{apkg_path}.partial"
+        with zipfile.ZipFile(partial_path, 'w', zipfile.ZIP_DEFLATED) as apkg:
+            apkg.write(collection_path, COLLECTION_NAME)
+            apkg.writestr("media", "{}")
+        os.replace(partial_path, apkg_path)
+
+    print(f"✅ Anki Deck Updated: {apkg_path} (+{len(note_rows)} new cards, {len(cards) - len(note_rows)} duplicates skipped)")
+    return len(note_rows)
+
+def export_phase3_notes(markdown_text, apkg_path, lecture_name="", deck_name=DEFAULT_DECK_NAME):
+    """Convenience wrapper used by the workflow: parse one lecture's notes and append them."""
+    cards = parse_phase3_cards(markdown_text, lecture_name)
+    if not cards:
+        print("Warning: No Key Definitions or Exam Questions found for Anki export.")
+        return 0
+    return export_apkg(cards, apkg_path, deck_name)
+
+if __name__ == "__main__":
+    # Bulk course export: python anki_exporter.py Course.apkg lecture1.md lecture2.md ...
+    import sys
+    if len(sys.argv) < 3:
+        print("Usage: python anki_exporter.py <deck.apkg> <phase3_notes.md> [...]")
+        sys.exit(1)
+    all_cards = []
+    for md_path in sys.argv[2:]:
+        with open(md_path, 'r', encoding='utf-8') as f:
+            all_cards.extend(parse_phase3_cards(f.read(), os.path.splitext(os.path.basename(md_path))[0]))
+    export_apkg(all_cards, sys.argv[1])
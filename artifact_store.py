@@ -0,0 +1,221 @@
+import os
+import sys
+import json
+import time
+import zlib
+import sqlite3
+
+# Single-file artifact store for every run's intermediate and final outputs.
+# One SQLite database holds many runs; each artifact is one (compressed) blob.
+# Phases hand results to each other through the store, and the files in
+# Final_Notes are materialized from it, so older runs can be re-exported later.
+
+DEFAULT_STORE_NAME = "study_artifacts.db"
+
+# Artifact names used by the workflow
+EXTRACTED_TEXT = "extracted_text"
+PAGE_TEXTS = "page_texts.json"
+PHASE1_MARKDOWN = "phase1_lecture_guide.md"
+PHASE2_MARKDOWN = "phase2_structured_guide.md"
+PHASE3_MARKDOWN = "phase3_exam_notes.md"
+PHASE5_MARKDOWN = "phase5_feynman.md"
+PODCAST_SCRIPT = "podcast_script.json"
+MERMAID_CODE = "phase6_mindmap.mmd"
+AUDIO_OVERVIEW = "audio_overview.mp3"
+INFOGRAPHIC = "Phase6_Infographic.png"
+METADATA = "metadata.json"
+MEMORY_REPORT = "memory_report.json"
+INPUT_DIGESTS = "input_digests.json"  # phase -> digest of its input, for incremental runs
+
+# Already-compressed formats are stored as-is
+RAW_SUFFIXES = ('.mp3', '.png', '.jpg', '.jpeg', '.docx', '.apkg')
+
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id integer primary key autoincrement,
+    lecture text not null,
+    source_path text not null,
+    started_at real not null,
+    finished_at real,
+    status text not null default 'running'
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    run_id integer not null references runs(id),
+    name text not null,
+    codec text not null,
+    size integer not null,
+    created_at real not null,
+    data blob not null,
+    primary key (run_id, name)
+);
+CREATE INDEX IF NOT EXISTS ix_runs_lecture ON runs (lecture, started_at);
+CREATE INDEX IF NOT EXISTS ix_artifacts_name ON artifacts (name, run_id);
+"""
+
+
+class ArtifactStore:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # Generous busy timeout: watch mode runs several lectures against the same file
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        # WAL lets background render jobs read while the workflow keeps writing
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.executescript(STORE_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- RUNS ---
+
+    def start_run(self, lecture, source_path):
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (lecture, source_path, started_at) VALUES (?, ?, ?)",
+                (lecture, source_path, time.time()),
+            )
+        return cursor.lastrowid
+
+    def finish_run(self, run_id, status="complete"):
+        with self.conn:
+            self.conn.execute("UPDATE runs SET finished_at = ?, status = ? WHERE id = ?", (time.time(), status, run_id))
+
+    def list_runs(self, lecture=None):
+        """Returns run dicts (newest first), each with the names of its artifacts."""
+        query = """
+            SELECT r.id, r.lecture, r.source_path, r.started_at, r.finished_at, r.status,
+                   group_concat(a.name, '|'), COALESCE(SUM(a.size), 0)
+            FROM runs r LEFT JOIN artifacts a ON a.run_id = r.id
+            {where} GROUP BY r.id ORDER BY r.started_at DESC
+        """
+        if lecture:
+            rows = self.conn.execute(query.format(where="WHERE r.lecture = ?"), (lecture,))
+        else:
+            rows = self.conn.execute(query.format(where=""))
+        return [{
+            "id": row[0], "lecture": row[1], "source_path": row[2], "started_at": row[3],
+            "finished_at": row[4], "status": row[5],
+            "artifacts": row[6].split('|') if row[6] else [], "size": row[7],
+        } for row in rows]
+
+    def latest_run(self, lecture, status="complete"):
+        row = self.conn.execute(
+            "SELECT id FROM runs WHERE lecture = ? AND status = ? ORDER BY started_at DESC LIMIT 1",
+            (lecture, status),
+        ).fetchone()
+        return row[0] if row else None
+
+    # --- ARTIFACTS ---
+
+    def put(self, run_id, name, data):
+        """Stores str, bytes, or JSON-serializable data under name for this run."""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        elif not isinstance(data, (bytes, bytearray)):
+            data = json.dumps(data).encode('utf-8')
+        if name.lower().endswith(RAW_SUFFIXES):
+            codec, blob = "raw", bytes(data)
+        else:
+            codec, blob = "zlib", zlib.compress(data, 6)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO artifacts (run_id, name, codec, size, created_at, data) VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, name, codec, len(data), time.time(), blob),
+            )
+
+    def put_file(self, run_id, name, path, chunk_size=1 << 20):
+        """
+        Like put, but for a file on disk. Raw artifacts (e.g. a spooled MP3) are copied
+        into the blob in chunks, so the file is never held in memory whole.
+        """
+        if not name.lower().endswith(RAW_SUFFIXES) or not hasattr(self.conn, "blobopen"):
+            with open(path, 'rb') as f:
+                return self.put(run_id, name, f.read())
+        size = os.path.getsize(path)
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR REPLACE INTO artifacts (run_id, name, codec, size, created_at, data) VALUES (?, ?, 'raw', ?, ?, zeroblob(?))",
+                (run_id, name, size, time.time(), size),
+            )
+            with self.conn.blobopen("artifacts", "data", cursor.lastrowid) as blob, open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    blob.write(chunk)
+
+    def copy_artifacts(self, from_run, to_run, names):
+        """Copies artifacts between runs without decompressing them. Returns how many were copied."""
+        marks = ", ".join("?" for _ in names)
+        with self.conn:
+            cursor = self.conn.execute(
+                f"INSERT OR REPLACE INTO artifacts (run_id, name, codec, size, created_at, data) "
+                f"SELECT ?, name, codec, size, created_at, data FROM artifacts WHERE run_id = ? AND name IN ({marks})",
+                (to_run, from_run, *names),
+            )
+        return cursor.rowcount
+
+    def get(self, run_id, name):
+        """Returns the artifact's bytes, or None if this run does not have it."""
+        row = self.conn.execute(
+            "SELECT codec, data FROM artifacts WHERE run_id = ? AND name = ?", (run_id, name)
+        ).fetchone()
+        if not row:
+            return None
+        codec, blob = row
+        return zlib.decompress(blob) if codec == "zlib" else bytes(blob)
+
+    def get_text(self, run_id, name):
+        data = self.get(run_id, name)
+        return data.decode('utf-8') if data is not None else None
+
+    def get_json(self, run_id, name):
+        data = self.get(run_id, name)
+        return json.loads(data) if data is not None else None
+
+    def materialize(self, run_id, name, output_path):
+        """Writes one stored artifact out as a file. Returns False if it is missing."""
+        data = self.get(run_id, name)
+        if data is None:
+            return False
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        print(f"✅ Exported from store: {output_path}")
+        return True
+
+
+def render_docx_from_store(db_path, run_id, name, output_path, title="Study Notes", backend=None):
+    """
+    Render-pool job: reads a phase's markdown from the store and writes the styled .docx.
+    Opens its own connection, so it is safe in worker threads and processes.
+    backend is passed to doc_styler ("docx" or "stream"; None = DOC_STYLER_BACKEND).
+    """
+    import doc_styler
+    with ArtifactStore(db_path) as store:
+        markdown_text = store.get_text(run_id, name)
+    if markdown_text is None:
+        raise KeyError(f"Run {run_id} has no artifact '{name}'")
+    doc_styler.create_styled_docx(markdown_text, output_path, title, backend)
+
+if __name__ == "__main__":
+    # Usage: python artifact_store.py <store.db> list [lecture]
+    #        python artifact_store.py <store.db> export <run_id> <name> <output_path>
+    # Exporting a .md artifact to a .docx path renders it through doc_styler.
+    if len(sys.argv) >= 3 and sys.argv[2] == "list":
+        with ArtifactStore(sys.argv[1]) as store:
+            for run in store.list_runs(sys.argv[3] if len(sys.argv) > 3 else None):
+                started = time.strftime('%Y-%m-%d %H:%M', time.localtime(run["started_at"]))
+                print(f"#{run['id']} {started} {run['lecture']} [{run['status']}] "
+                      f"{len(run['artifacts'])} artifacts, {run['size'] / 1024:.0f} KiB")
+    elif len(sys.argv) == 6 and sys.argv[2] == "export" and sys.argv[5].endswith('.docx') and sys.argv[4].endswith('.md'):
+        render_docx_from_store(sys.argv[1], int(sys.argv[3]), sys.argv[4], sys.argv[5])
+    elif len(sys.argv) == 6 and sys.argv[2] == "export":
+        with ArtifactStore(sys.argv[1]) as store:
+            if not store.materialize(int(sys.argv[3]), sys.argv[4], sys.argv[5]):
+                print(f"❌ Run {sys.argv[3]} has no artifact '{sys.argv[4]}'")
+    else:
+        print("Usage: python artifact_store.py <store.db> list [lecture]")
+        print("       python artifact_store.py <store.db> export <run_id> <name> <output_path>")
@@ -1,7 +1,27 @@
+import io
+import os
 import edge_tts
 import json
 import asyncio
 
+# Set to e.g. http://127.0.0.1:8765/tts/v1 to synthesize against mock_upstreams.py instead of edge-tts
+TTS_BASE_URL = os.getenv('TTS_BASE_URL')
+
+async def stream_speech(text, voice, rate):
+    """Yields edge-tts style chunks ({"type": "audio", "data": ...}) from edge-tts or the TTS_BASE_URL stub."""
+    if not TTS_BASE_URL:
+        async for chunk in edge_tts.Communicate(text, voice, rate=rate).stream():
+            yield chunk
+        return
+
+    import aiohttp
+    async with aiohttp.ClientSession() as session:
+        async with session.post(f"{TTS_BASE_URL.rstrip('/')}/synthesize",
+                                json={"text": text, "voice": voice, "rate": rate}) as response:
+            response.raise_for_status()
+            async for data in response.content.iter_chunked(64 * 1024):
+                yield {"type": "audio", "data": data}
+
 async def synthesize_audio(script_json_path, output_path):
     """
     Reads a JSON script and synthesizes audio using edge-tts.
@@ -21,6 +41,16 @@ async def synthesize_audio(script_json_path, output_path):
         print(f"Error: Invalid JSON in {script_json_path}.")
         return
 
+    await synthesize_script_audio(script, output_path)
+
+async def synthesize_script_audio(script, output_path=None, spool=False, spool_if=None):
+    """
+    Synthesizes an already-parsed script (list of {"speaker", "text"} dicts).
+    Returns the MP3 bytes, and also writes them to output_path if one is given.
+
+    Low-memory path (needs output_path): with spool=True, or once spool_if() returns True
+    between lines, audio is streamed straight into output_path and None is returned.
+    """
     # Voice assignments as per requirements
     # Alex: en-US-AndrewNeural (Energetic Male)
     # Jamie: en-US-AvaNeural (Professional Female)
@@ -29,34 +59,49 @@ async def synthesize_audio(script_json_path, output_path):
         "Jamie": "en-US-AvaNeural"
     }
 
-    print(f"Synthesizing audio to {output_path}...")
-    
-    # We will collect all audio data in memory and write it once (or append to file).
-    # Ideally, for long audio, we might want to append to file to save memory, 
-    # but for 7 minutes, memory should be fine.
+    print(f"Synthesizing audio{f' to {output_path}' if output_path else ''}...")
     
-    final_audio = b""
+    # Audio is collected in one BytesIO (bytes += chunk copied the whole track on every
+    # chunk; BytesIO.getvalue() hands the buffer over without a copy), or appended to
+    # output_path when spooling.
+    final_audio = io.BytesIO()
+    spool_file = open(output_path, "wb") if spool and output_path else None
     
-    for item in script:
-        speaker = item.get("speaker")
-        text = item.get("text")
-        
-        if not speaker or not text:
-            continue
+    try:
+        for item in script:
+            speaker = item.get("speaker")
+            text = item.get("text")
             
-        voice = VOICE_MAP.get(speaker, "en-US-AndrewNeural") # Default to Alex
-        
-        # Rate set to -5% for natural study pace
-        communicate = edge_tts.Communicate(text, voice, rate="-5%")
-        
-        async for chunk in communicate.stream():
-            if chunk["type"] == "audio":
-                final_audio += chunk["data"]
+            if not speaker or not text:
+                continue
                 
-    with open(output_path, "wb") as f:
-        f.write(final_audio)
+            voice = VOICE_MAP.get(speaker, "en-US-AndrewNeural") # Default to Alex
+            
+            # Rate set to -5% for natural study pace
+            async for chunk in stream_speech(text, voice, rate="-5%"):
+                if chunk["type"] == "audio":
+                    (spool_file or final_audio).write(chunk["data"])
+
+            if not spool_file and output_path and spool_if and spool_if():
+                # Memory got tight mid-script: flush what we have and stream the rest to disk
+                spool_file = open(output_path, "wb")
+                spool_file.write(final_audio.getbuffer())
+                final_audio = io.BytesIO()
+    finally:
+        if spool_file:
+            spool_file.close()
 
-    print(f"Audio synthesis complete! Saved to {output_path}")
+    if spool_file:
+        print(f"Audio synthesis complete! Streamed to {output_path}")
+        return None
+    final_audio = final_audio.getvalue()
+    if output_path:
+        with open(output_path, "wb") as f:
+            f.write(final_audio)
+        print(f"Audio synthesis complete! Saved to {output_path}")
+    else:
+        print("Audio synthesis complete!")
+    return final_audio
 
 if __name__ == "__main__":
     # Test block
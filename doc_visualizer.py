@@ -5,6 +5,9 @@ import requests
 import json
 from openai import OpenAI
 
+OPENROUTER_BASE_URL = os.getenv('OPENROUTER_BASE_URL', "https://openrouter.ai/api/v1")
+MERMAID_INK_URL = os.getenv('MERMAID_INK_URL', "https://mermaid.ink").rstrip('/')
+
 INTERNAL_VISUALIZER_PROMPT = """
 ACT AS: A Senior Visual Strategist. 
 TASK: Create a professional, MULTI-COLORED Mermaid.js Mindmap.
@@ -30,10 +33,11 @@ SOURCE CONTEXT:
 ---
 """
 
-def generate_mindmap_png(context_text, api_key, output_path):
+def generate_mermaid_code(context_text, api_key):
+    """Asks the Visualizer Model for a mindmap and returns the sanitized Mermaid code (None on failure)."""
     print("\n--- [Phase 6] Visualizer Module Initialized ---")
     print("Connecting to Visualizer Model (xiaomi/mimo-v2-flash)...")
-    client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=api_key)
+    client = OpenAI(base_url=OPENROUTER_BASE_URL, api_key=api_key)
 
     try:
         # 1. Generate Mermaid Code
@@ -87,40 +91,55 @@ def generate_mindmap_png(context_text, api_key, output_path):
         
         if not final_code.strip():
             print("❌ Error: Generated Mermaid code is empty after sanitization.")
-            return False
-        
-        # 3. ENCODING (JSON State Protocol)
-        # We use 'default' theme. Removed 'look': 'handDrawn' as it can cause 400 errors on some renderers.
-        state = {
-            "code": final_code,
-            "mermaid": {"theme": "default"}
-        }
-        json_str = json.dumps(state)
-        
-        # Use urlsafe_b64encode to ensure the link doesn't break
-        base64_str = base64.urlsafe_b64encode(json_str.encode('utf-8')).decode('ascii')
-        
-        url = f"https://mermaid.ink/img/{base64_str}"
-        print("Rendering Infographic via Mermaid.Ink...")
-        
-        try:
-            # Fix: Add User-Agent to avoid being blocked by the server
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36"
-            }
-            response = requests.get(url, headers=headers, timeout=30)
-            if response.status_code == 200:
-                with open(output_path, 'wb') as f:
-                    f.write(response.content)
-                print(f"✅ Clean, Multi-Colored Infographic Saved: {output_path}")
-                return True
-            else:
-                print(f"❌ Renderer Refused Request (Status {response.status_code})")
-                return False
-        except Exception as e:
-            print(f"❌ Connection Failed: {e}")
-            return False
+            return None
+
+        return final_code
 
     except Exception as e:
         print(f"❌ Visualizer Failed: {e}")
-        return False
\ No newline at end of file
+        return None
+
+def render_mermaid_png(final_code):
+    """Renders sanitized Mermaid code to PNG bytes via Mermaid.Ink (None on failure)."""
+    # 3. ENCODING (JSON State Protocol)
+    # We use 'default' theme. Removed 'look': 'handDrawn' as it can cause 400 errors on some renderers.
+    state = {
+        "code": final_code,
+        "mermaid": {"theme": "default"}
+    }
+    json_str = json.dumps(state)
+    
+    # Use urlsafe_b64encode to ensure the link doesn't break
+    base64_str = base64.urlsafe_b64encode(json_str.encode('utf-8')).decode('ascii')
+    
+    url = f"{MERMAID_INK_URL}/img/{base64_str}"
+    print("Rendering Infographic via Mermaid.Ink...")
+    
+    try:
+        # Fix: Add User-Agent to avoid being blocked by the server
+        headers = {
+            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36"
+        }
+        response = requests.get(url, headers=headers, timeout=30)
+        if response.status_code == 200:
+            return response.content
+        else:
+            print(f"❌ Renderer Refused Request (Status {response.status_code})")
+            return None
+    except Exception as e:
+        print(f"❌ Connection Failed: {e}")
+        return None
+
+def generate_mindmap_png(context_text, api_key, output_path):
+    final_code = generate_mermaid_code(context_text, api_key)
+    if not final_code:
+        return False
+
+    png_bytes = render_mermaid_png(final_code)
+    if not png_bytes:
+        return False
+
+    with open(output_path, 'wb') as f:
+        f.write(png_bytes)
+    print(f"✅ Clean, Multi-Colored Infographic Saved: {output_path}")
+    return True
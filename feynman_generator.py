@@ -2,9 +2,9 @@ import os
 from openai import OpenAI
 import doc_styler
 
-def generate_feynman_doc(master_context, api_key, output_path):
+def generate_feynman_markdown(master_context, api_key):
     """
-    Generates a Feynman Mastery Page using OpenRouter (MiMo-v2-Flash) and styles it using doc_styler.
+    Asks OpenRouter (MiMo-v2-Flash) for the Feynman Mastery Page and returns its markdown (None on failure).
     """
     print("\n--- [Phase 5] Feynman Mastery Module Initialized ---")
     print("Connecting to OpenRouter (Model: xiaomi/mimo-v2-flash:free) with Reasoning Enabled...")
@@ -48,40 +48,56 @@ def generate_feynman_doc(master_context, api_key, output_path):
         
         if not markdown_text:
             print("Error: Empty response from AI.")
-            return False
+            return None
+
+        return markdown_text
+
+    except Exception as e:
+        print(f"Error in Feynman Module: {e}")
+        return None
+
+def print_analogy(markdown_text):
+    """Extracts and prints the 12-Year-Old Analogy section of a Feynman Mastery Page."""
+    lines = markdown_text.split('\n')
+    # print(f"   (Generated {len(lines)} lines of synthesized knowledge)") # Optional clutter removal
+
+    analogy_text = []
+    capture = False
+    found_analogy = False
+    
+    for line in lines:
+        if "The 12-Year-Old Analogy" in line:
+            capture = True
+            found_analogy = True
+            continue # Skip the header itself
+        if capture:
+            if any(header in line for header in ["The Jargon Translator", "The \"Blind Spot\" Audit"]):
+                capture = False
+                break
+            analogy_text.append(line)
+    
+    if found_analogy:
+        print("\n".join(analogy_text).strip())
+    else:
+        print("(Analogy section not strictly found in output, printing first 500 chars of response instead)")
+        print(markdown_text[:500] + "...")
 
+def generate_feynman_doc(master_context, api_key, output_path):
+    """
+    Generates a Feynman Mastery Page using OpenRouter (MiMo-v2-Flash) and styles it using doc_styler.
+    """
+    markdown_text = generate_feynman_markdown(master_context, api_key)
+    if not markdown_text:
+        return False
+
+    try:
         # --- Create Styled Document ---
-        output_docx = output_path # Renaming for clarity as per the edit
-        print(f"Styling Feynman Mastery Page to {output_docx}...")
-        
-        doc_styler.create_styled_docx(markdown_text, output_docx, title="Feynman Mastery")
-        
-        lines = markdown_text.split('\n')
-        print(f"✅ Phase 5 Mastery Page Saved: {output_docx}")
-        # print(f"   (Generated {len(lines)} lines of synthesized knowledge)") # Optional clutter removal
+        print(f"Styling Feynman Mastery Page to {output_path}...")
+        doc_styler.create_styled_docx(markdown_text, output_path, title="Feynman Mastery")
+        print(f"✅ Phase 5 Mastery Page Saved: {output_path}")
 
         # --- Extract and print the 12-Year-Old Analogy ---
-        analogy_text = []
-        capture = False
-        found_analogy = False
-        
-        for line in lines:
-            if "The 12-Year-Old Analogy" in line:
-                capture = True
-                found_analogy = True
-                continue # Skip the header itself
-            if capture:
-                if any(header in line for header in ["The Jargon Translator", "The \"Blind Spot\" Audit"]):
-                    capture = False
-                    break
-                analogy_text.append(line)
-        
-        if found_analogy:
-            print("\n".join(analogy_text).strip())
-        else:
-            print("(Analogy section not strictly found in output, printing first 500 chars of response instead)")
-            print(response_text[:500] + "...")
-            
+        print_analogy(markdown_text)
         return True
 
     except Exception as e:
@@ -0,0 +1,346 @@
+import re
+import math
+import hashlib
+import difflib
+from qa_index import tokenize
+
+# Incremental regeneration for re-uploaded lectures.
+#
+# The new PDF's pages are aligned with the previous run's pages, and every
+# Phase 1 concept block is traced back to the pages it was written from
+# (TF-IDF similarity). Only blocks built on changed pages are regenerated.
+# Their Phase 2 blocks and Phase 3 entries are found the same way, so the
+# rewritten pieces can be spliced into the previous outputs in place.
+
+CONCEPT_HEADING = re.compile(r'^\s*###\s+Concept\b[^\n]*', re.IGNORECASE)
+HEADING = re.compile(r'^\s*#{1,3}\s')
+# Fenced code blocks: '# comment' lines inside them are code, not headings
+CODE_FENCE = re.compile(r'^\s*(```|~~~)')
+# A page counts towards a concept block when it scores at least this fraction of the block's best page
+PAGE_RELEVANCE = 0.5
+# Above this fraction of changed pages, a full regeneration is cheaper and safer than splicing
+MAX_CHANGED_FRACTION = 0.5
+
+# Phase 3 sections (see PHASE_3_PROMPT), by the keywords in their titles
+PHASE3_SECTION_KEYS = (
+    ("definitions", ("definition",)),
+    ("formulas", ("formula", "cheat sheet", "complexity")),
+    ("algorithms", ("algorithm", "deep dive")),
+    ("questions", ("question",)),
+)
+PHASE3_SECTION_TITLE = re.compile(r'^\s*(\d+\.|[IVX]+\.)?\s*\*\*([^*]+)\*\*\s*:?\s*')
+BULLET = re.compile(r'^(\s*)([-*+]|\d+\.)\s')
+
+
+def compact(text):
+    """Whitespace-normalized text, so re-extraction noise does not count as a change."""
+    return " ".join((text or "").split())
+
+def input_digest(*parts):
+    """Digest of a phase's (compacted) input, used to decide whether the phase must run again."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(compact(part).encode('utf-8'))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+def _fence_after(line, fence):
+    """The code fence still open after this line (None outside code blocks)."""
+    if fence:
+        return None if line.strip().startswith(fence) else fence
+    opened = CODE_FENCE.match(line)
+    return opened.group(1) if opened else None
+
+def pages_to_text(pages):
+    return "".join(page + "\n" for page in pages if page)
+
+
+# --- PAGE DIFF ---
+
+def diff_pages(old_pages, new_pages):
+    """
+    Aligns the two page lists (slides may be inserted or removed).
+    Returns (changed_old, changed_new, old_to_new): indexes of old pages that were edited or
+    removed, of new pages that were edited or inserted, and the mapping of identical pages.
+    """
+    matcher = difflib.SequenceMatcher(None, [compact(p) for p in old_pages], [compact(p) for p in new_pages], autojunk=False)
+    changed_old, changed_new, old_to_new = set(), set(), {}
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            old_to_new.update(zip(range(i1, i2), range(j1, j2)))
+        else:
+            changed_old.update(range(i1, i2))
+            changed_new.update(range(j1, j2))
+    return changed_old, changed_new, old_to_new
+
+
+# --- PROVENANCE (TF-IDF) ---
+
+def similarity(items, sources):
+    """Cosine similarity of every item against every source: a len(items) x len(sources) list of rows."""
+    docs = [_counts(text) for text in items + sources]
+    df = {}
+    for counts in docs:
+        for term in counts:
+            df[term] = df.get(term, 0) + 1
+    n = len(docs)
+    vectors = []
+    for counts in docs:
+        vector = {term: tf * math.log(1 + n / df[term]) for term, tf in counts.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        vectors.append({term: w / norm for term, w in vector.items()})
+    item_vectors, source_vectors = vectors[:len(items)], vectors[len(items):]
+    return [[_dot(iv, sv) for sv in source_vectors] for iv in item_vectors]
+
+def _counts(text):
+    counts = {}
+    for term in tokenize(text):
+        counts[term] = counts.get(term, 0) + 1
+    return counts
+
+def _dot(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(term, 0.0) for term, w in a.items())
+
+def pages_of_blocks(block_texts, pages):
+    """For each concept block, the set of page indexes it was most likely written from."""
+    result = []
+    for scores in similarity(block_texts, pages):
+        best = max(scores, default=0.0)
+        result.append({i for i, s in enumerate(scores) if best > 0 and s >= best * PAGE_RELEVANCE})
+    return result
+
+def derived_from(items, sources, source_indexes):
+    """Indexes of items whose closest source is one of source_indexes."""
+    if not items or not sources or not source_indexes:
+        return set()
+    derived = set()
+    for i, scores in enumerate(similarity(items, sources)):
+        best = max(range(len(scores)), key=scores.__getitem__)
+        if scores[best] > 0 and best in source_indexes:
+            derived.add(i)
+    return derived
+
+
+# --- CONCEPT BLOCKS (Phase 1 / Phase 2) ---
+
+def split_concepts(markdown_text):
+    """
+    Splits markdown into segments: ("text", chunk) or ("concept", chunk). A concept block
+    runs from its '### Concept' heading to the next heading outside a code block;
+    joining the chunks gives the input back.
+    """
+    segments = []
+    kind, lines = "text", []
+    fence = None
+
+    def flush():
+        if lines:
+            segments.append((kind, "".join(lines)))
+
+    for line in markdown_text.splitlines(keepends=True):
+        in_code, fence = fence is not None, _fence_after(line, fence)
+        if in_code:
+            lines.append(line)
+        elif CONCEPT_HEADING.match(line):
+            flush()
+            kind, lines = "concept", [line]
+        elif HEADING.match(line) and kind == "concept":
+            flush()
+            kind, lines = "text", [line]
+        else:
+            lines.append(line)
+    flush()
+    return segments
+
+def concept_name(block):
+    """Normalized name from a block's '### Concept: [Name]' heading."""
+    heading = CONCEPT_HEADING.match(block).group(0)
+    return " ".join(re.sub(r'[^a-z0-9]+', ' ', heading.lower().split('concept', 1)[1]).split())
+
+def concept_blocks(markdown_text):
+    """The '### Concept' blocks of a Phase 1/2 document, in order."""
+    return [chunk for kind, chunk in split_concepts(markdown_text) if kind == "concept"]
+
+def splice_concepts(markdown_text, removed, new_blocks):
+    """
+    Drops the concept blocks at positions `removed` and puts new_blocks where the first of them
+    was (or after the last concept block when nothing was removed). Everything else is kept verbatim.
+    """
+    segments = split_concepts(markdown_text)
+    concept_positions = [i for i, (kind, _) in enumerate(segments) if kind == "concept"]
+    removed_positions = {concept_positions[i] for i in removed}
+    if removed_positions:
+        insert_at = min(removed_positions)
+    elif concept_positions:
+        insert_at = concept_positions[-1] + 1
+    else:
+        insert_at = len(segments)
+
+    new_text = "".join(block if block.endswith("\n") else block + "\n" for block in new_blocks)
+    out = []
+    for i, (_, chunk) in enumerate(segments):
+        if i == insert_at:
+            out.append(new_text)
+        if i not in removed_positions:
+            out.append(chunk)
+    if insert_at >= len(segments):
+        if out and not out[-1].endswith("\n"):
+            out.append("\n")
+        out.append(new_text)
+    return "".join(out)
+
+
+# --- PHASE 3 ENTRIES ---
+
+def _phase3_section(line):
+    """Returns (section key, inline rest) if the line opens a Phase 3 section, else None."""
+    if HEADING.match(line):
+        title, rest = line, ""
+    else:
+        match = PHASE3_SECTION_TITLE.match(line)
+        if not match:
+            return None
+        title, rest = match.group(2), line[match.end():]
+    lowered = title.lower()
+    for key, words in PHASE3_SECTION_KEYS:
+        if any(word in lowered for word in words):
+            return key, rest
+    return None
+
+def split_phase3(markdown_text):
+    """
+    Splits Phase 3 notes into segments: ("text", None, chunk) for headings and prose, and
+    ("item", section, chunk) for each entry (a bullet with its continuation lines; an
+    "Answer:" bullet stays with its "Question:").
+    """
+    segments = []
+    section, item = None, None
+    fence = None
+
+    def close_item():
+        nonlocal item
+        if item is not None:
+            segments.append(("item", section, "".join(item)))
+            item = None
+
+    for line in markdown_text.splitlines(keepends=True):
+        in_code, fence = fence is not None, _fence_after(line, fence)
+        if in_code:
+            if item is not None:
+                item.append(line)
+            else:
+                segments.append(("text", None, line))
+            continue
+        opened = _phase3_section(line)
+        if opened:
+            close_item()
+            section, rest = opened
+            if rest.strip():
+                # "4. **Potential Exam Questions:** - Question: ..." -> title line + first entry
+                segments.append(("text", None, line[:len(line) - len(rest)].rstrip() + "\n"))
+                item = ["   " + rest.strip() + "\n"]
+            else:
+                segments.append(("text", None, line))
+            continue
+        if HEADING.match(line):
+            close_item()
+            section = None
+            segments.append(("text", None, line))
+            continue
+        if section is None:
+            segments.append(("text", None, line))
+            continue
+
+        bullet = BULLET.match(line)
+        is_answer = bool(re.match(r'^\s*([-*+]\s*)?\**answer', line, re.IGNORECASE))
+        if bullet and not is_answer and (item is None or len(bullet.group(1)) <= _indent(item[0])):
+            close_item()
+            item = [line]
+        elif item is not None:
+            item.append(line)
+        elif line.strip():
+            item = [line]
+        else:
+            segments.append(("text", None, line))
+    close_item()
+    return segments
+
+def _indent(line):
+    return len(line) - len(line.lstrip())
+
+def merge_phase3(old_notes, fragment, stale_items):
+    """
+    Drops the old entries at positions stale_items (in item order) and appends the fragment's
+    entries to the matching sections. Returns None when the notes have no recognizable sections.
+    """
+    old_segments = split_phase3(old_notes)
+    if not any(kind == "item" for kind, _, _ in old_segments):
+        return None
+    additions = {}
+    for kind, section, chunk in split_phase3(fragment or ""):
+        if kind == "item":
+            additions.setdefault(section, []).append(chunk if chunk.endswith("\n") else chunk + "\n")
+
+    # New entries go right after the last old entry (or title) of their section
+    last_of_section = {}
+    item_index = 0
+    current = None
+    for position, (kind, section, chunk) in enumerate(old_segments):
+        if kind == "text" and _phase3_section(chunk):
+            current = _phase3_section(chunk)[0]
+            last_of_section[current] = position
+        elif kind == "item":
+            last_of_section[section] = position
+
+    out = []
+    for position, (kind, section, chunk) in enumerate(old_segments):
+        if kind == "item":
+            if item_index not in stale_items:
+                out.append(chunk)
+            item_index += 1
+        else:
+            out.append(chunk)
+        for key, last in last_of_section.items():
+            if last == position and key in additions:
+                if out and not out[-1].endswith("\n"):
+                    out.append("\n")
+                out.extend(additions.pop(key))
+    # Sections the old notes did not have at all
+    for key, chunks in additions.items():
+        out.append(f"\n**{key.title()}:**\n")
+        out.extend(chunks)
+    return "".join(out)
+
+def phase3_items(markdown_text):
+    return [chunk for kind, _, chunk in split_phase3(markdown_text) if kind == "item"]
+
+
+# --- PLANNING ---
+
+def plan_update(old_pages, new_pages, phase1_markdown):
+    """
+    Decides what to regenerate. Returns None when too much changed for splicing, else
+    {"changed_pages": [...new indexes], "affected": [...Phase 1 concept positions],
+     "source_pages": [...new indexes to send to the model]}.
+    """
+    changed_old, changed_new, old_to_new = diff_pages(old_pages, new_pages)
+    if not changed_old and not changed_new:
+        return {"changed_pages": [], "affected": [], "source_pages": []}
+    if len(changed_new | changed_old) > MAX_CHANGED_FRACTION * max(len(old_pages), len(new_pages), 1):
+        return None
+
+    blocks = concept_blocks(phase1_markdown)
+    block_pages = pages_of_blocks(blocks, old_pages) if blocks and old_pages else [set() for _ in blocks]
+    affected = [i for i, pages in enumerate(block_pages) if pages & changed_old]
+
+    # The model sees the new text of every changed page plus the unchanged pages the affected blocks also drew on
+    source_pages = set(changed_new)
+    for i in affected:
+        source_pages.update(old_to_new[p] for p in block_pages[i] if p in old_to_new)
+    return {
+        "changed_pages": sorted(changed_new),
+        "affected": affected,
+        "source_pages": sorted(source_pages),
+    }
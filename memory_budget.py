@@ -0,0 +1,322 @@
+import gc
+import os
+import time
+import threading
+import tracemalloc
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Per-phase memory accounting for run_workflow.
+#
+# run_workflow calls tracker.begin(name) as each phase starts. A background
+# thread samples the process RSS, which sees everything (including lxml's C-heap
+# python-docx trees and pdfplumber's page objects); with MEMORY_TRACEMALLOC=1 the
+# Python-heap peak and retained bytes of each phase are recorded as well.
+# tracemalloc is opt-in because it slows pdfplumber extraction roughly 6x.
+#
+# Budgets (MB) apply to a phase's peak growth over its starting memory:
+#   MEMORY_BUDGET_MB=400                          default for every phase
+#   MEMORY_BUDGETS=extract=300,phase4=150,render=200   per-phase overrides
+#   MEMORY_RSS_LIMIT_MB=1500                      whole-process ceiling (e.g. below the worker's cgroup limit)
+# Phases with a low-memory path switch to it when their estimate does not fit
+# or when tracker.check() trips mid-phase. Every other phase is checked when it
+# ends (tracker.begin() of the next one), and a phase over budget fails the run
+# with the report.
+#
+# RSS and tracemalloc are process-wide: in watch mode with WATCH_CONCURRENCY > 1
+# the numbers include the other lectures running at the same time. A phase that
+# overlaps another run is marked "shared" and only MEMORY_RSS_LIMIT_MB applies
+# to it, so one lecture's growth never fails another as over its phase budget.
+
+SAMPLE_SECONDS = 0.05
+
+# Trackers currently between start() and stop(), and how many of them use tracemalloc
+_ACTIVE = set()
+_REGISTRY_LOCK = threading.Lock()
+_TRACEMALLOC_USERS = 0
+_TRACEMALLOC_STARTED = False   # True when a tracker (not the caller) turned tracemalloc on
+MB = 1024 * 1024
+
+# Measured working-set estimates, in bytes per unit of input
+DOCX_TREE_BYTES_PER_CHAR = 200     # python-docx/lxml tree, per markdown char
+STREAM_DOCX_BYTES_PER_CHAR = 15    # StreamingDocStyler, per markdown char
+MP3_BYTES_PER_WORD = 2400          # edge-tts 48 kbit/s at ~2.5 spoken words/sec
+
+
+class MemoryBudgetExceeded(MemoryError):
+    def __init__(self, phase, used, budget, report=""):
+        self.phase, self.used, self.budget, self.report = phase, used, budget, report
+        super().__init__(f"Phase '{phase}' used {used / MB:.0f} MB, over its {budget / MB:.0f} MB budget")
+
+
+def read_rss():
+    """Current resident set size in bytes, or None where it cannot be measured."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def parse_budgets(spec):
+    """'extract=300,phase4=150' -> {'extract': 300 MB, 'phase4': 150 MB} in bytes."""
+    budgets = {}
+    for item in (spec or "").split(','):
+        if '=' in item:
+            name, value = item.split('=', 1)
+            budgets[name.strip()] = int(float(value) * MB)
+    return budgets
+
+
+class PhaseStats:
+    def __init__(self, name, budget):
+        self.name = name
+        self.budget = budget
+        self.rss_start = self.rss_peak = self.rss_end = read_rss()
+        self.heap_start = self.heap_peak = self.heap_end = None
+        self.seconds = 0.0
+        self.degraded = None   # description of the low-memory path taken, if any
+        self.peak_before_degrade = None
+        self.over_budget = False
+        self.shared = False    # another run was active during this phase: per-phase budget not applied
+
+    @property
+    def rss_growth(self):
+        if self.rss_start is None:
+            return 0
+        return max(0, self.rss_peak - self.rss_start)
+
+    @property
+    def heap_growth(self):
+        if self.heap_start is None:
+            return 0
+        return max(0, self.heap_peak - self.heap_start)
+
+    @property
+    def used(self):
+        """Peak growth the budget is compared against: the larger of the RSS and heap views."""
+        return max(self.rss_growth, self.heap_growth)
+
+    def as_dict(self):
+        return {
+            "phase": self.name,
+            "seconds": round(self.seconds, 2),
+            "budget_mb": round(self.budget / MB, 1) if self.budget else None,
+            "rss_start_mb": round(self.rss_start / MB, 1) if self.rss_start is not None else None,
+            "rss_peak_mb": round(self.rss_peak / MB, 1) if self.rss_peak is not None else None,
+            "rss_retained_mb": round((self.rss_end - self.rss_start) / MB, 1) if self.rss_start is not None else None,
+            "heap_peak_mb": round(self.heap_growth / MB, 1) if self.heap_start is not None else None,
+            "heap_retained_mb": round((self.heap_end - self.heap_start) / MB, 1) if self.heap_start is not None else None,
+            "over_budget": self.over_budget,
+            "shared": self.shared,
+            "degraded": self.degraded,
+            "peak_before_degrade_mb": round(self.peak_before_degrade / MB, 1) if self.peak_before_degrade is not None else None,
+        }
+
+
+class MemoryTracker:
+    def __init__(self, budgets=None, default_budget=None, rss_limit=None, use_tracemalloc=None):
+        """Budgets and limits are in bytes; anything left as None is read from the environment."""
+        self.budgets = budgets if budgets is not None else parse_budgets(os.getenv('MEMORY_BUDGETS'))
+        if default_budget is None and os.getenv('MEMORY_BUDGET_MB'):
+            default_budget = int(float(os.getenv('MEMORY_BUDGET_MB')) * MB)
+        self.default_budget = default_budget
+        if rss_limit is None and os.getenv('MEMORY_RSS_LIMIT_MB'):
+            rss_limit = int(float(os.getenv('MEMORY_RSS_LIMIT_MB')) * MB)
+        self.rss_limit = rss_limit
+        if use_tracemalloc is None:
+            use_tracemalloc = os.getenv('MEMORY_TRACEMALLOC', "0") == "1"
+        self.use_tracemalloc = use_tracemalloc
+        self.phases = []
+        self.current = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+
+    # --- lifecycle ---
+
+    def start(self):
+        global _TRACEMALLOC_USERS, _TRACEMALLOC_STARTED
+        with _REGISTRY_LOCK:
+            if self.use_tracemalloc:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _TRACEMALLOC_STARTED = True
+                _TRACEMALLOC_USERS += 1
+            _ACTIVE.add(self)
+            if len(_ACTIVE) > 1:
+                for tracker in _ACTIVE:
+                    tracker._mark_shared()
+        if read_rss() is not None:
+            self._sampler = threading.Thread(target=self._sample, name="memory-sampler", daemon=True)
+            self._sampler.start()
+        return self
+
+    def stop(self):
+        global _TRACEMALLOC_USERS, _TRACEMALLOC_STARTED
+        self.end()
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+        with _REGISTRY_LOCK:
+            _ACTIVE.discard(self)
+            if self.use_tracemalloc:
+                _TRACEMALLOC_USERS -= 1
+                # Only the last tracker stops it, so concurrent runs keep their heap numbers
+                if _TRACEMALLOC_USERS == 0 and _TRACEMALLOC_STARTED:
+                    tracemalloc.stop()
+                    _TRACEMALLOC_STARTED = False
+
+    def _mark_shared(self):
+        with self._lock:
+            if self.current is not None:
+                self.current.shared = True
+
+    @staticmethod
+    def concurrent():
+        """True while more than one tracker (i.e. more than one run) is active in this process."""
+        with _REGISTRY_LOCK:
+            return len(_ACTIVE) > 1
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_SECONDS):
+            rss = read_rss()
+            with self._lock:
+                stats = self.current
+                if stats is not None and rss > stats.rss_peak:
+                    stats.rss_peak = rss
+
+    # --- budgets ---
+
+    def budget_for(self, name):
+        return self.budgets.get(name, self.default_budget)
+
+    def headroom(self, name, include_rss_limit=True):
+        """
+        Bytes this phase may still grow by before hitting its budget or the process ceiling (None = unlimited).
+        include_rss_limit=False leaves out the ceiling, for work that runs in another process.
+        """
+        limits = []
+        stats = self.current if self.current and self.current.name == name else None
+        if stats is not None:
+            self._refresh(stats)
+        budget = self.budget_for(name)
+        shared = stats.shared if stats else self.concurrent()
+        if budget and not shared:
+            limits.append(budget - (stats.used if stats else 0))
+        if self.rss_limit and include_rss_limit:
+            rss = read_rss()
+            if rss is not None:
+                limits.append(self.rss_limit - rss)
+        return min(limits) if limits else None
+
+    def fits(self, name, estimated_bytes, include_rss_limit=True):
+        """True when a working set of estimated_bytes fits the phase's remaining headroom."""
+        room = self.headroom(name, include_rss_limit)
+        return room is None or estimated_bytes <= room
+
+    def check(self):
+        """Raises MemoryBudgetExceeded if the current phase is over its budget or the process over its ceiling."""
+        stats = self.current
+        if stats is None:
+            return
+        self._refresh(stats)
+        if stats.budget and not stats.shared and stats.used > stats.budget:
+            stats.over_budget = True
+            raise MemoryBudgetExceeded(stats.name, stats.used, stats.budget, self.report())
+        if self.rss_limit and stats.rss_peak is not None and stats.rss_peak > self.rss_limit:
+            stats.over_budget = True
+            raise MemoryBudgetExceeded(stats.name, stats.rss_peak, self.rss_limit, self.report())
+
+    def degrade(self, description):
+        """
+        Records that the current phase switched to its low-memory path.
+        The phase's baseline restarts here, so the budget then applies to the low-memory path alone.
+        """
+        stats = self.current
+        print(f"⚠️ [Memory] {stats.name if stats else 'workflow'}: {description}")
+        if stats is None:
+            return
+        self._refresh(stats)
+        stats.degraded = description
+        stats.over_budget = False  # from here on it is the low-memory path's budget
+        stats.peak_before_degrade = max(stats.used, stats.peak_before_degrade or 0)
+        gc.collect()
+        with self._lock:
+            stats.rss_start = stats.rss_peak = read_rss()
+        if stats.heap_start is not None:
+            tracemalloc.reset_peak()
+            stats.heap_start = stats.heap_peak = tracemalloc.get_traced_memory()[0]
+
+    def _refresh(self, stats):
+        rss = read_rss()
+        if rss is not None and rss > stats.rss_peak:
+            stats.rss_peak = rss
+        if stats.heap_start is not None and tracemalloc.is_tracing():
+            stats.heap_end, peak = tracemalloc.get_traced_memory()
+            stats.heap_peak = max(stats.heap_peak, peak)
+
+    # --- phases ---
+
+    def begin(self, name):
+        """
+        Ends the current phase (if any) and starts accounting for the next one.
+        Raises MemoryBudgetExceeded if the phase that just ended ran over its budget.
+        """
+        self.check()
+        self.end()
+        stats = PhaseStats(name, self.budget_for(name))
+        stats.shared = self.concurrent()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            stats.heap_start = stats.heap_peak = stats.heap_end = tracemalloc.get_traced_memory()[0]
+        stats._t0 = time.perf_counter()
+        with self._lock:
+            self.current = stats
+        self.phases.append(stats)
+        return stats
+
+    def end(self):
+        stats = self.current
+        if stats is None:
+            return
+        self._refresh(stats)
+        stats.rss_end = read_rss()
+        stats.seconds = time.perf_counter() - stats._t0
+        if stats.budget and not stats.shared and stats.used > stats.budget:
+            stats.over_budget = True
+        with self._lock:
+            self.current = None
+
+    # --- reporting ---
+
+    def as_dicts(self):
+        return [stats.as_dict() for stats in self.phases]
+
+    def report(self):
+        lines = [f"{'phase':<10} {'secs':>7} {'rss peak':>10} {'rss kept':>10} {'heap peak':>10} {'heap kept':>10} {'budget':>8}  notes"]
+        for s in self.as_dicts():
+            def fmt(value):
+                return f"{value:.1f}MB" if value is not None else "-"
+            notes = []
+            if s["over_budget"]:
+                notes.append("OVER BUDGET")
+            if s["shared"]:
+                notes.append("shared with another run (phase budget not applied)")
+            if s["degraded"]:
+                notes.append(f"{s['degraded']} (peaked {s['peak_before_degrade_mb']:.1f}MB before)")
+            lines.append(
+                f"{s['phase']:<10} {s['seconds']:>7.2f} {fmt(s['rss_peak_mb']):>10} {fmt(s['rss_retained_mb']):>10} "
+                f"{fmt(s['heap_peak_mb']):>10} {fmt(s['heap_retained_mb']):>10} {fmt(s['budget_mb']):>8}  {', '.join(notes)}"
+            )
+        return "\n".join(lines)
+
@@ -0,0 +1,463 @@
+import os
+import re
+import json
+import math
+import time
+import zlib
+import base64
+import struct
+import random
+import asyncio
+import hashlib
+import argparse
+from aiohttp import web, ClientSession
+
+# Local stand-ins for every upstream the workflow talks to, for load-testing
+# run_workflow without network access or API quota:
+#
+#   OpenAI-compatible chat   POST /v1/chat/completions                  (OPENROUTER_BASE_URL=http://HOST:PORT/v1)
+#   Gemini-compatible        POST /v1beta/models/{model}:generateContent
+#                            POST /v1beta/models/{model}:streamGenerateContent   (GEMINI_API_ENDPOINT=http://HOST:PORT)
+#   TTS stub                 POST /tts/v1/synthesize                     (TTS_BASE_URL=http://HOST:PORT/tts/v1)
+#   mermaid.ink-compatible   GET  /img/{base64 state}                    (MERMAID_INK_URL=http://HOST:PORT)
+#
+# Each service gets a latency distribution and injected 429 / 5xx rates. Responses
+# are synthetic unless --replay points at recordings; --record proxies to the real
+# upstreams and saves what they return. GET /__stats reports per-service counters.
+
+SERVICES = ("openai", "gemini", "tts", "mermaid")
+
+REAL_UPSTREAMS = {
+    "openai": "https://openrouter.ai/api",
+    "gemini": "https://generativelanguage.googleapis.com",
+    "mermaid": "https://mermaid.ink",
+}
+
+# One silent MPEG-1 Layer III frame (128 kbps, 44.1 kHz): ~26 ms of audio
+SILENT_MP3_FRAME = bytes.fromhex("fffb9064") + bytes(413)
+MP3_FRAMES_PER_SECOND = 44100 / 1152
+
+
+def parse_latency(spec):
+    """
+    Turns a latency spec into a sampler returning seconds:
+    fixed:S | uniform:A,B | normal:MEAN,SD | lognormal:MEDIAN,SIGMA
+    """
+    kind, _, args = spec.partition(':')
+    values = [float(v) for v in args.split(',')] if args else []
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency spec '{spec}' (use fixed/uniform/normal/lognormal)")
+
+
+class ServiceConfig:
+    def __init__(self, latency="fixed:0", rate_429=0.0, rate_5xx=0.0, stream_chunk_delay=0.02):
+        self.latency_spec = latency
+        self.sample_latency = parse_latency(latency)
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.stream_chunk_delay = stream_chunk_delay
+
+
+class Recordings:
+    """
+    Recorded responses on disk: <dir>/<service>/<request hash>.json holding
+    {"status", "content_type", "method", "endpoint", "stream", "body": text or base64 "body_b64"}.
+    Replay prefers an exact request match and otherwise cycles through the service's recordings
+    of the same method, endpoint and stream mode, so a streaming client never gets a plain body.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.cursor = {}
+        self.index = {}   # service -> {(method, endpoint, stream): [file names]}
+
+    @staticmethod
+    def request_key(method, path, body):
+        return hashlib.sha256(method.encode() + b" " + path.encode() + b"\n" + body).hexdigest()[:24]
+
+    def _service_dir(self, service):
+        return os.path.join(self.root, service)
+
+    def save(self, service, key, status, content_type, body, method=None, endpoint=None, stream=None):
+        os.makedirs(self._service_dir(service), exist_ok=True)
+        record = {"status": status, "content_type": content_type, "method": method, "endpoint": endpoint, "stream": stream}
+        try:
+            record["body"] = body.decode('utf-8')
+        except UnicodeDecodeError:
+            record["body_b64"] = base64.b64encode(body).decode('ascii')
+        with open(os.path.join(self._service_dir(service), f"{key}.json"), 'w', encoding='utf-8') as f:
+            json.dump(record, f)
+
+    def _read(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _similar(self, service, shape):
+        """File names of the service's recordings with the same (method, endpoint, stream)."""
+        if service not in self.index:
+            folder = self._service_dir(service)
+            groups = {}
+            for name in sorted(n for n in os.listdir(folder) if n.endswith('.json')):
+                record = self._read(os.path.join(folder, name))
+                groups.setdefault((record.get("method"), record.get("endpoint"), record.get("stream")), []).append(name)
+            self.index[service] = groups
+        return self.index[service].get(shape, [])
+
+    def load(self, service, key, method=None, endpoint=None, stream=None):
+        folder = self._service_dir(service)
+        if not os.path.isdir(folder):
+            return None
+        path = os.path.join(folder, f"{key}.json")
+        if not os.path.exists(path):
+            shape = (method, endpoint, stream)
+            names = self._similar(service, shape)
+            if not names:
+                return None
+            index = self.cursor.get((service, shape), 0)
+            self.cursor[(service, shape)] = index + 1
+            path = os.path.join(folder, names[index % len(names)])
+        record = self._read(path)
+        if "body_b64" in record:
+            record["body"] = base64.b64decode(record.pop("body_b64"))
+        else:
+            record["body"] = record["body"].encode('utf-8')
+        return record
+
+
+def split_recorded_stream(body, stream):
+    """Recordings of streamed responses are saved whole; this cuts them back into chunks for replay."""
+    if stream == "sse":
+        return [event for event in re.findall(rb'.*?(?:\r?\n\r?\n|$)', body, re.S) if event] or [body]
+    size = max(1, len(body) // 20)
+    return [body[i:i + size] for i in range(0, len(body), size)] or [body]
+
+
+# --- SYNTHETIC CONTENT ---
+
+def synthetic_markdown(prompt, concepts=4):
+    """Phase-shaped markdown so the downstream styling/Anki/index code has real work to do."""
+    topic = (re.findall(r'[A-Z][a-z]{4,}', prompt) or ["Hashing"])[0]
+    blocks = [f"# {topic}: Mock Lecture Guide", "## I. Metadata & Goals", "- **Learning Objectives:** Analyze, Implement."]
+    for i in range(concepts):
+        blocks += [
+            f"### Concept: {topic} Idea {i + 1}",
+            "- **Core Logic:** Keys are mapped to buckets in $O(1)$ average time.",
+            "- **\"Make it Click\" Analogy:** ==Just like a coat check ticket==.",
+            "- **Deep Dive:** __Collisions__ degrade lookups to $O(n)$.",
+        ]
+    blocks += [
+        "1. **Key Definitions:**",
+        f"   - **{topic}:** A ==mock== definition with $n/m$ load.",
+        "4. **Potential Exam Questions:**",
+        "   - Question: Why do collisions matter?",
+        "   - Answer: __Step 1: they chain__",
+        "| Term | Academic | ==Human== |",
+        "|---|---|---|",
+        "| Load | $\\alpha$ | **How full** |",
+    ]
+    return "\n".join(blocks)
+
+def synthetic_chat_reply(prompt):
+    if "dialogue script" in prompt:
+        lines = [{"speaker": "Alex" if i % 2 == 0 else "Jamie", "text": f"Mock line {i} about the lecture."} for i in range(40)]
+        return json.dumps(lines)
+    if "Mermaid" in prompt:
+        pillars = "\n".join(f'    ("Pillar {p}")\n' + "\n".join(f'      ["Detail {p}{d}"]' for d in range(4)) for p in range(5))
+        return f'mindmap\n  (("Mock Subject"))\n{pillars}'
+    return synthetic_markdown(prompt)
+
+def tiny_png():
+    """A valid 1x1 white PNG."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(b"\x00\xff\xff\xff")) + chunk(b"IEND", b""))
+
+def split_for_stream(text, pieces=20):
+    size = max(1, len(text) // pieces)
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+# --- SERVER ---
+
+class MockUpstreams:
+    def __init__(self, configs, replay_dir=None, record_dir=None, upstreams=None):
+        self.configs = configs
+        self.replay = Recordings(replay_dir) if replay_dir else None
+        self.record = Recordings(record_dir) if record_dir else None
+        self.upstreams = upstreams or REAL_UPSTREAMS
+        self.session = None
+        self.stats = {}
+        self.started = time.time()
+
+    def _count(self, service, outcome, seconds=None):
+        s = self.stats.setdefault(service, {"requests": 0, "outcomes": {}, "latency_total": 0.0})
+        s["requests"] += 1
+        s["outcomes"][outcome] = s["outcomes"].get(outcome, 0) + 1
+        if seconds is not None:
+            s["latency_total"] += seconds
+
+    async def _gate(self, service, error_format):
+        """Applies latency, then maybe an injected error. Returns an error response or None."""
+        config = self.configs[service]
+        delay = config.sample_latency()
+        await asyncio.sleep(delay)
+        roll = random.random()
+        if roll < config.rate_429:
+            self._count(service, "429", delay)
+            return error_format(429)
+        if roll < config.rate_429 + config.rate_5xx:
+            status = random.choice((500, 502, 503))
+            self._count(service, str(status), delay)
+            return error_format(status)
+        self._count(service, "200", delay)
+        return None
+
+    async def _proxy_or_replay(self, request, service, body, endpoint=None, stream=None):
+        """
+        Record mode proxies to the real upstream; replay mode serves a recording. None = synthesize.
+        endpoint (default: the request path) and stream ("sse", "json" or None) describe the
+        response shape a fallback recording must have.
+        """
+        key = Recordings.request_key(request.method, request.path, body)
+        endpoint = endpoint or request.path
+        if self.record:
+            url = self.upstreams[service] + request.path_qs
+            headers = {k: v for k, v in request.headers.items() if k.lower() in ("authorization", "content-type", "x-goog-api-key", "user-agent")}
+            async with self.session.request(request.method, url, data=body or None, headers=headers) as upstream:
+                payload = await upstream.read()
+                self.record.save(service, key, upstream.status, upstream.content_type, payload, request.method, endpoint, stream)
+                return web.Response(status=upstream.status, body=payload, content_type=upstream.content_type)
+        if self.replay:
+            record = self.replay.load(service, key, request.method, endpoint, stream)
+            if not record:
+                return None
+            if not record.get("stream") or record["status"] != 200:
+                return web.Response(status=record["status"], body=record["body"], content_type=record["content_type"])
+            response = web.StreamResponse(status=record["status"], headers={"Content-Type": record["content_type"]})
+            await response.prepare(request)
+            for chunk in split_recorded_stream(record["body"], record["stream"]):
+                await response.write(chunk)
+                await asyncio.sleep(self.configs[service].stream_chunk_delay)
+            await response.write_eof()
+            return response
+        return None
+
+    # --- OpenAI-compatible chat ---
+
+    @staticmethod
+    def _openai_error(status):
+        kind = "rate_limit_exceeded" if status == 429 else "server_error"
+        return web.json_response({"error": {"message": f"Mock upstream error {status}", "type": kind, "code": status}}, status=status)
+
+    async def openai_chat(self, request):
+        body = await request.read()
+        failure = await self._gate("openai", self._openai_error)
+        if failure:
+            return failure
+        payload = json.loads(body or b"{}")
+        recorded = await self._proxy_or_replay(request, "openai", body, stream="sse" if payload.get("stream") else None)
+        if recorded:
+            return recorded
+
+        prompt = "\n".join(str(m.get("content", "")) for m in payload.get("messages", []))
+        reply = synthetic_chat_reply(prompt)
+        model = payload.get("model", "mock-model")
+        created = int(time.time())
+        if not payload.get("stream"):
+            return web.json_response({
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(reply) // 4,
+                          "total_tokens": (len(prompt) + len(reply)) // 4},
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        pieces = split_for_stream(reply)
+        for i, piece in enumerate(pieces):
+            chunk = {
+                "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece} if i else {"role": "assistant", "content": piece},
+                             "finish_reason": None}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(self.configs["openai"].stream_chunk_delay)
+        final = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": created, "model": model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        await response.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+        await response.write_eof()
+        return response
+
+    # --- Gemini-compatible ---
+
+    @staticmethod
+    def _gemini_error(status):
+        names = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 502: "UNAVAILABLE", 503: "UNAVAILABLE"}
+        return web.json_response({"error": {"code": status, "message": f"Mock upstream error {status}", "status": names[status]}}, status=status)
+
+    @staticmethod
+    def _gemini_payload(text, prompt_len):
+        return {
+            "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {"promptTokenCount": prompt_len // 4, "candidatesTokenCount": len(text) // 4,
+                              "totalTokenCount": (prompt_len + len(text)) // 4},
+        }
+
+    async def gemini_generate(self, request):
+        body = await request.read()
+        failure = await self._gate("gemini", self._gemini_error)
+        if failure:
+            return failure
+        # streamGenerateContent: SSE with ?alt=sse, otherwise a streamed JSON array
+        streamed = request.match_info["method"] == "streamGenerateContent"
+        sse = request.query.get("alt") == "sse"
+        recorded = await self._proxy_or_replay(request, "gemini", body, stream=("sse" if sse else "json") if streamed else None)
+        if recorded:
+            return recorded
+
+        payload = json.loads(body or b"{}")
+        prompt = "\n".join(p.get("text", "") for c in payload.get("contents", []) for p in c.get("parts", []))
+        reply = synthetic_markdown(prompt)
+        if not streamed:
+            return web.json_response(self._gemini_payload(reply, len(prompt)))
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream" if sse else "application/json"})
+        await response.prepare(request)
+        pieces = split_for_stream(reply)
+        if not sse:
+            await response.write(b"[")
+        for i, piece in enumerate(pieces):
+            data = json.dumps(self._gemini_payload(piece, len(prompt)))
+            await response.write(f"data: {data}\r\n\r\n".encode() if sse else (("," if i else "") + data).encode())
+            await asyncio.sleep(self.configs["gemini"].stream_chunk_delay)
+        if not sse:
+            await response.write(b"]")
+        await response.write_eof()
+        return response
+
+    # --- TTS stub ---
+
+    async def tts_synthesize(self, request):
+        payload = await request.json()
+        failure = await self._gate("tts", lambda status: web.Response(status=status, text=f"Mock TTS error {status}"))
+        if failure:
+            return failure
+        # Roughly the speaking time of the text at ~2.5 words/sec, streamed as silent MP3 frames
+        seconds = max(0.5, len(payload.get("text", "").split()) / 2.5)
+        frames = int(seconds * MP3_FRAMES_PER_SECOND)
+        response = web.StreamResponse(headers={"Content-Type": "audio/mpeg"})
+        await response.prepare(request)
+        batch = 40
+        for start in range(0, frames, batch):
+            await response.write(SILENT_MP3_FRAME * min(batch, frames - start))
+            await asyncio.sleep(self.configs["tts"].stream_chunk_delay)
+        await response.write_eof()
+        return response
+
+    # --- mermaid.ink-compatible ---
+
+    async def mermaid_img(self, request):
+        failure = await self._gate("mermaid", lambda status: web.Response(status=status, text=f"Mock renderer error {status}"))
+        if failure:
+            return failure
+        recorded = await self._proxy_or_replay(request, "mermaid", b"", endpoint="/img")
+        if recorded:
+            return recorded
+        return web.Response(body=tiny_png(), content_type="image/png")
+
+    # --- control ---
+
+    async def get_stats(self, request):
+        uptime = time.time() - self.started
+        report = {"uptime_seconds": round(uptime, 1), "services": {}}
+        for service, s in self.stats.items():
+            report["services"][service] = {
+                "requests": s["requests"],
+                "requests_per_second": round(s["requests"] / uptime, 2) if uptime else 0.0,
+                "outcomes": s["outcomes"],
+                "mean_injected_latency": round(s["latency_total"] / s["requests"], 3),
+            }
+        return web.json_response(report)
+
+    async def reset_stats(self, request):
+        self.stats, self.started = {}, time.time()
+        return web.json_response({"reset": True})
+
+    async def _on_startup(self, app):
+        if self.record:
+            self.session = ClientSession()
+
+    async def _on_cleanup(self, app):
+        if self.session:
+            await self.session.close()
+
+    def make_app(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.add_routes([
+            web.post('/v1/chat/completions', self.openai_chat),
+            web.post('/api/v1/chat/completions', self.openai_chat),
+            web.post(r'/{version:v1(beta)?}/models/{model}:{method:generateContent|streamGenerateContent}', self.gemini_generate),
+            web.post('/tts/v1/synthesize', self.tts_synthesize),
+            web.get('/img/{state}', self.mermaid_img),
+            web.get('/__stats', self.get_stats),
+            web.post('/__reset', self.reset_stats),
+        ])
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local record/replay stand-ins for Gemini, OpenRouter, edge-tts and mermaid.ink.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="lognormal:0.8,0.5",
+                        help="Default latency for every service: fixed:S | uniform:A,B | normal:MEAN,SD | lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="Fraction of requests answered with 500/502/503")
+    parser.add_argument("--stream-chunk-delay", type=float, default=0.02, help="Seconds between streamed chunks")
+    for service in SERVICES:
+        parser.add_argument(f"--latency-{service}", help=f"Latency override for {service}")
+        parser.add_argument(f"--rate-429-{service}", type=float, help=f"429 rate override for {service}")
+        parser.add_argument(f"--rate-5xx-{service}", type=float, help=f"5xx rate override for {service}")
+    parser.add_argument("--replay", metavar="DIR", help="Serve recorded responses from DIR/<service>/")
+    parser.add_argument("--record", metavar="DIR", help="Proxy to the real upstreams and save responses into DIR")
+    parser.add_argument("--seed", type=int, help="Seed for reproducible latency/error sampling")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    def override(name, service, default):
+        value = getattr(args, f"{name}_{service}")
+        return default if value is None else value
+
+    configs = {
+        service: ServiceConfig(
+            latency=override("latency", service, args.latency),
+            rate_429=override("rate_429", service, args.rate_429),
+            rate_5xx=override("rate_5xx", service, args.rate_5xx),
+            stream_chunk_delay=args.stream_chunk_delay,
+        )
+        for service in SERVICES
+    }
+    mocks = MockUpstreams(configs, replay_dir=args.replay, record_dir=args.record)
+    base = f"http://{args.host}:{args.port}"
+    print("Mock upstreams ready. Point the agent at them with:")
+    print(f"  OPENROUTER_BASE_URL={base}/v1")
+    print(f"  GEMINI_API_ENDPOINT={base}")
+    print(f"  TTS_BASE_URL={base}/tts/v1")
+    print(f"  MERMAID_INK_URL={base}")
+    print(f"Stats: GET {base}/__stats")
+    web.run_app(mocks.make_app(), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import io
+import os
+import sys
+import time
+import difflib
+import pdfplumber
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+from pdfminer.converter import TextConverter
+from pdfminer.layout import LAParams
+from pdfminer.pdfpage import PDFPage
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+# Pluggable PDF text extractors. Each backend yields the text of one page at a time.
+# pdfplumber stays the default; the others skip its character-level layout model,
+# which the LLM prompts never need.
+
+DEFAULT_EXTRACTOR = "pdfplumber"
+
+
+def iter_pages_pdfplumber(pdf_path):
+    """Full layout analysis per character (slowest, the original behaviour)."""
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            yield page.extract_text() or ""
+            page.flush_cache()  # drop the per-page char objects as we go
+
+def iter_pages_pdfminer(pdf_path):
+    """pdfminer's low-level interpreter + TextConverter, no per-character objects kept."""
+    resources = PDFResourceManager(caching=True)
+    buffer = io.StringIO()
+    device = TextConverter(resources, buffer, laparams=LAParams())
+    interpreter = PDFPageInterpreter(resources, device)
+    try:
+        with open(pdf_path, 'rb') as f:
+            for page in PDFPage.get_pages(f):
+                interpreter.process_page(page)
+                yield buffer.getvalue().rstrip('\x0c')
+                buffer.seek(0)
+                buffer.truncate(0)
+    finally:
+        device.close()
+
+def iter_pages_pypdfium2(pdf_path):
+    """PDFium's native text layer (fastest, needs the pypdfium2 wheel)."""
+    if pypdfium2 is None:
+        raise ImportError("pypdfium2 is not installed. Run: pip install pypdfium2")
+    pdf = pypdfium2.PdfDocument(pdf_path)
+    try:
+        for page in pdf:
+            textpage = page.get_textpage()
+            yield textpage.get_text_range().replace('\r\n', '\n')
+            textpage.close()
+            page.close()
+    finally:
+        pdf.close()
+
+EXTRACTORS = {
+    "pdfplumber": iter_pages_pdfplumber,
+    "pdfminer": iter_pages_pdfminer,
+    "pypdfium2": iter_pages_pypdfium2,
+}
+
+def low_memory_extractor():
+    """The installed backend with the smallest working set (used when extraction runs over its memory budget)."""
+    return "pypdfium2" if pypdfium2 is not None else "pdfminer"
+
+def iter_pdf_pages(pdf_path, backend=None):
+    """Yields page texts using the chosen backend (PDF_EXTRACTOR env var, else pdfplumber)."""
+    backend = backend or os.getenv('PDF_EXTRACTOR', DEFAULT_EXTRACTOR)
+    if backend not in EXTRACTORS:
+        raise ValueError(f"Unknown PDF extractor '{backend}'. Choose from: {', '.join(EXTRACTORS)}")
+    return EXTRACTORS[backend](pdf_path)
+
+
+# --- BENCHMARK ---
+
+def fidelity(reference, candidate):
+    """
+    Similarity (0-1) of a candidate extraction against the reference, as (content, words).
+    content ignores whitespace, since pdfplumber itself sometimes glues words together;
+    words also scores word boundaries and line order.
+    """
+    content = difflib.SequenceMatcher(None, "".join(reference.split()), "".join(candidate.split()), autojunk=False).ratio()
+    words = difflib.SequenceMatcher(None, reference.split(), candidate.split(), autojunk=False).ratio()
+    return content, words
+
+def run_benchmark(pdf_paths, backends=None):
+    """Prints pages/sec per backend and mean per-page fidelity against pdfplumber on the same corpus."""
+    backends = backends or list(EXTRACTORS)
+    reference = {}
+    for backend in [DEFAULT_EXTRACTOR] + [b for b in backends if b != DEFAULT_EXTRACTOR]:
+        pages, elapsed, scores = 0, 0.0, []
+        try:
+            for path in pdf_paths:
+                start = time.perf_counter()
+                texts = list(iter_pdf_pages(path, backend))
+                elapsed += time.perf_counter() - start
+                pages += len(texts)
+                if backend == DEFAULT_EXTRACTOR:
+                    reference[path] = texts
+                else:
+                    # Compared page by page: whole-document diffs punish harmless reordering
+                    scores.extend(fidelity(ref, text) for ref, text in zip(reference[path], texts))
+        except ImportError as e:
+            print(f"{backend:>10}: skipped ({e})")
+            continue
+        rate = pages / elapsed if elapsed else float('inf')
+        if scores:
+            content = sum(s[0] for s in scores) / len(scores)
+            words = sum(s[1] for s in scores) / len(scores)
+            score = f"content {content:.3f}, words {words:.3f}"
+        else:
+            score = "reference"
+        print(f"{backend:>10}: {pages} pages in {elapsed:.2f}s = {rate:.1f} pages/sec | fidelity: {score}")
+
+if __name__ == "__main__":
+    # Usage: python pdf_extractors.py [file.pdf ...]   (defaults to every PDF in this folder)
+    corpus = sys.argv[1:] or [f for f in os.listdir('.') if f.lower().endswith('.pdf')]
+    if not corpus:
+        print("Usage: python pdf_extractors.py <file.pdf> [...]")
+        sys.exit(1)
+    run_benchmark(corpus)
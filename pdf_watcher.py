@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+
+# Watch mode: polls an input folder for new or changed lecture PDFs and hands
+# each one to the workflow exactly once per distinct content.
+#
+# - Debounce: a PDF is only queued once its size and mtime have stayed the same
+#   for `settle_seconds`, so half-copied uploads are never processed.
+# - Change detection: files are keyed by SHA-256, so touching or re-saving an
+#   identical PDF does nothing, while a revised upload is processed again.
+# - Persistence: per-file state lives in a JSON file, keyed by absolute path, so
+#   after a restart (from any working directory, or with the folder spelled
+#   differently) only PDFs that are new, changed, or failed last time are processed.
+
+DEFAULT_STATE_NAME = "watch_state.json"
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PdfWatcher:
+    def __init__(self, input_dir, state_path, process, max_concurrency=2, poll_seconds=2.0, settle_seconds=5.0):
+        """
+        process: async callable taking a PDF path and returning True on success.
+        """
+        self.input_dir = input_dir
+        self.state_path = state_path
+        self.process = process
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.state = self._load_state()
+        self.pending = {}      # path -> (size, mtime, first seen with this signature)
+        self.in_flight = set()
+        self.tasks = set()
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: Could not read watch state ({e}). Starting fresh.")
+            return {}
+        # Failures get one fresh attempt per restart; within a session they wait for a new upload
+        for entry in state.values():
+            if entry["status"] == "failed":
+                entry["status"] = "retry"
+        # Older state files were keyed by the path as typed
+        return {os.path.abspath(path): entry for path, entry in state.items()}
+
+    def _save_state(self):
+        # Write-then-rename so a crash never leaves a truncated state file
+        partial_path = f"{self.state_path}.partial"
+        with open(partial_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(partial_path, self.state_path)
+
+    def scan(self):
+        """One polling pass: returns PDFs whose writes have settled and whose content is new."""
+        ready = []
+        now = time.monotonic()
+        seen = set()
+        for entry in os.scandir(self.input_dir):
+            if not entry.is_file() or not entry.name.lower().endswith('.pdf'):
+                continue
+            path = os.path.abspath(entry.path)
+            seen.add(path)
+            if path in self.in_flight:
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                self.pending.pop(path, None)  # deleted or renamed since scandir listed it
+                continue
+            signature = (stat.st_size, stat.st_mtime)
+
+            known = self.state.get(path)
+            if known and (known["size"], known["mtime"]) == signature and known["status"] != "retry":
+                continue  # untouched since it was last handled
+
+            previous = self.pending.get(path)
+            if not previous or previous[:2] != signature:
+                self.pending[path] = (*signature, now)  # (re)start the debounce window
+                continue
+            if now - previous[2] < self.settle_seconds:
+                continue
+
+            del self.pending[path]
+            try:
+                sha = file_sha256(path)
+            except OSError as e:
+                print(f"⚠️ [Watch] Skipping {path}: {e}")
+                continue
+            if known and known["sha256"] == sha and known["status"] != "retry":
+                # Same bytes, new mtime (re-copied): remember the signature, skip the work
+                known.update(size=signature[0], mtime=signature[1])
+                self._save_state()
+                continue
+            ready.append((path, sha, signature))
+
+        # Forget debounce entries for files that disappeared mid-upload
+        for path in list(self.pending):
+            if path not in seen:
+                del self.pending[path]
+        return ready
+
+    async def _run_one(self, path, sha, signature):
+        async with self.semaphore:
+            print(f"\n[Watch] Processing {path}...")
+            started = time.time()
+            try:
+                ok = await self.process(path)
+            except Exception as e:
+                print(f"❌ [Watch] {path} failed: {e}")
+                ok = False
+            self.state[path] = {
+                "sha256": sha, "size": signature[0], "mtime": signature[1],
+                "status": "done" if ok else "failed",
+                "processed_at": time.time(), "seconds": round(time.time() - started, 1),
+            }
+            self._save_state()
+            self.in_flight.discard(path)
+            print(f"{'✅' if ok else '❌'} [Watch] {path} {'done' if ok else 'failed'}.")
+
+    async def run(self):
+        print(f"👀 Watching '{self.input_dir}' for new or changed PDFs (Ctrl+C to stop)...")
+        while True:
+            try:
+                ready = self.scan()
+            except OSError as e:
+                # e.g. the folder itself is briefly unavailable (network share, remount)
+                print(f"⚠️ [Watch] Could not scan '{self.input_dir}': {e}")
+                ready = []
+            for path, sha, signature in ready:
+                self.in_flight.add(path)
+                task = asyncio.create_task(self._run_one(path, sha, signature))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+            await asyncio.sleep(self.poll_seconds)
@@ -0,0 +1,259 @@
+import os
+import re
+import sys
+import json
+import math
+import mmap
+import array
+from openai import OpenAI
+
+# Phase 8: Local BM25 retrieval over the generated notes, for Q&A without
+# sending the whole master_study_context on every question.
+#
+# On-disk layout (one folder per lecture, next to the .docx outputs):
+#   meta.json     - BM25 parameters, block list (source, heading, byte span), doc lengths
+#   vocab.json    - term -> [offset into postings.bin (in uint32 units), document frequency]
+#   postings.bin  - uint32 pairs (block id, term frequency), grouped by term
+#   blocks.txt    - UTF-8 block texts, sliced by the byte spans in meta.json
+# postings.bin and blocks.txt are memory-mapped, so loading an index reads almost nothing.
+
+QA_MODEL = "xiaomi/mimo-v2-flash:free"
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were
+will with what which who how why when where does do can into than then there their these
+""".split())
+
+QA_PROMPT = """
+Act as a patient Teaching Assistant. Answer the student's question using ONLY the study-note excerpts below.
+If the excerpts do not contain the answer, say so plainly.
+
+STRICT FORMATTING RULES:
+1. Wrap ALL formulas or math in $ ... $.
+2. Cite the excerpt headings you used in **bold**.
+
+STUDY NOTE EXCERPTS:
+---
+{context}
+---
+
+QUESTION: {question}
+"""
+
+
+def tokenize(text):
+    """Lowercase alphanumeric terms, markdown markers and stopwords dropped."""
+    return [t for t in re.findall(r'[a-z0-9]+', text.lower()) if t not in STOPWORDS]
+
+def split_concept_blocks(markdown_text, source):
+    """
+    Splits one phase's markdown into concept-level blocks at '##'/'###' headings.
+    Returns [{"source": ..., "heading": ..., "text": ...}, ...]
+    """
+    blocks = []
+    heading, lines = source, []
+
+    def flush():
+        text = "\n".join(lines).strip()
+        if text:
+            blocks.append({"source": source, "heading": heading, "text": text})
+
+    for line in markdown_text.split('\n'):
+        stripped = line.strip()
+        if stripped.startswith('## ') or stripped.startswith('### '):
+            flush()
+            heading, lines = stripped.lstrip('#').strip(), [stripped]
+        else:
+            lines.append(line)
+    flush()
+    return blocks
+
+
+class BM25Index:
+    """A BM25 inverted index over concept blocks, persisted as memory-mappable files."""
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(os.path.join(index_dir, "vocab.json"), 'r', encoding='utf-8') as f:
+            self.vocab = json.load(f)
+        self.blocks = meta["blocks"]
+        self.doc_lens = meta["doc_lens"]
+        self.avgdl = meta["avgdl"] or 1.0
+        self.k1, self.b = meta["k1"], meta["b"]
+
+        self._files = []
+        self._postings = self._map("postings.bin")
+        self._texts = self._map("blocks.txt")
+        self.postings = memoryview(self._postings).cast('I') if self._postings else memoryview(array.array('I'))
+
+    def _map(self, name):
+        f = open(os.path.join(self.index_dir, name), 'rb')
+        self._files.append(f)
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        self.postings.release()
+        for m in (self._postings, self._texts):
+            if m is not None:
+                m.close()
+        for f in self._files:
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def build(blocks, index_dir, k1=BM25_K1, b=BM25_B):
+        """Tokenizes the blocks once and writes the index files into index_dir."""
+        os.makedirs(index_dir, exist_ok=True)
+        postings = {}
+        doc_lens = []
+        spans = []
+        offset = 0
+
+        with open(os.path.join(index_dir, "blocks.txt"), 'wb') as texts:
+            for doc_id, block in enumerate(blocks):
+                terms = tokenize(block["text"])
+                doc_lens.append(len(terms))
+                counts = {}
+                for term in terms:
+                    counts[term] = counts.get(term, 0) + 1
+                for term, tf in counts.items():
+                    postings.setdefault(term, []).extend((doc_id, tf))
+
+                data = block["text"].encode('utf-8')
+                texts.write(data)
+                spans.append({"source": block["source"], "heading": block["heading"],
+                              "start": offset, "end": offset + len(data)})
+                offset += len(data)
+
+        vocab = {}
+        flat = array.array('I')
+        for term in sorted(postings):
+            vocab[term] = [len(flat), len(postings[term]) // 2]
+            flat.extend(postings[term])
+        with open(os.path.join(index_dir, "postings.bin"), 'wb') as f:
+            flat.tofile(f)
+        with open(os.path.join(index_dir, "vocab.json"), 'w', encoding='utf-8') as f:
+            json.dump(vocab, f)
+        with open(os.path.join(index_dir, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump({
+                "k1": k1, "b": b,
+                "avgdl": sum(doc_lens) / len(doc_lens) if doc_lens else 0.0,
+                "doc_lens": doc_lens,
+                "blocks": spans,
+            }, f)
+        print(f"✅ Q&A Index Built: {index_dir} ({len(blocks)} blocks, {len(vocab)} terms)")
+
+    def block_text(self, doc_id):
+        span = self.blocks[doc_id]
+        return self._texts[span["start"]:span["end"]].decode('utf-8')
+
+    def search(self, query, k=5):
+        """Returns the top-k [(score, block dict with text), ...] for the query."""
+        n_docs = len(self.blocks)
+        scores = {}
+        for term in set(tokenize(query)):
+            entry = self.vocab.get(term)
+            if not entry:
+                continue
+            start, df = entry
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            pairs = self.postings[start:start + 2 * df]
+            for i in range(0, 2 * df, 2):
+                doc_id, tf = pairs[i], pairs[i + 1]
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_lens[doc_id] / self.avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+            pairs.release()
+
+        top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(score, dict(self.blocks[doc_id], text=self.block_text(doc_id))) for doc_id, score in top]
+
+
+def build_study_index(phase_outputs, index_dir):
+    """
+    Builds the Q&A index from {source label: markdown} (Phase 1-3 and Feynman outputs).
+    """
+    blocks = []
+    for source, markdown_text in phase_outputs.items():
+        if markdown_text:
+            blocks.extend(split_concept_blocks(markdown_text, source))
+    BM25Index.build(blocks, index_dir)
+
+def answer_question(question, index_dir, api_key, k=5):
+    """Answers a question by sending only the top-k retrieved blocks to the model."""
+    with BM25Index(index_dir) as index:
+        hits = index.search(question, k)
+    if not hits:
+        print("No matching study notes found for this question.")
+        return None
+
+    context = "\n\n".join(f"[{hit['source']} / {hit['heading']}]\n{hit['text']}" for _, hit in hits)
+    client = OpenAI(
+        base_url=os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
+        api_key=api_key
+    )
+    try:
+        completion = client.chat.completions.create(
+            model=QA_MODEL,
+            messages=[{"role": "user", "content": QA_PROMPT.format(context=context, question=question)}]
+        )
+        return completion.choices[0].message.content
+    except Exception as e:
+        print(f"Error answering question: {e}")
+        return None
+
+def run_benchmark(n_blocks=5000, n_queries=200):
+    """Times index build, load and query latency on synthetic concept blocks."""
+    import time
+    import random
+    import tempfile
+
+    rng = random.Random(0)
+    words = [f"term{i}" for i in range(5000)]
+    blocks = [
+        {"source": "Bench", "heading": f"Concept: {i}", "text": " ".join(rng.choices(words, k=150))}
+        for i in range(n_blocks)
+    ]
+    queries = [" ".join(rng.choices(words, k=6)) for _ in range(n_queries)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        BM25Index.build(blocks, tmp)
+        build_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with BM25Index(tmp) as index:
+            load_s = time.perf_counter() - start
+            latencies = []
+            for q in queries:
+                start = time.perf_counter()
+                index.search(q, 5)
+                latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    print(f"Build: {build_s:.2f}s for {n_blocks} blocks | Load: {load_s * 1000:.1f} ms")
+    print(f"Query latency: p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f} ms over {n_queries} queries")
+
+if __name__ == "__main__":
+    # Usage: python qa_index.py <index_dir> "your question"   |   python qa_index.py --bench
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        run_benchmark()
+    elif len(sys.argv) > 2:
+        from dotenv import load_dotenv
+        load_dotenv()
+        answer = answer_question(" ".join(sys.argv[2:]), sys.argv[1], os.getenv('OPENROUTER_API_KEY'))
+        if answer:
+            print(answer)
+    else:
+        print('Usage: python qa_index.py <index_dir> "question"  |  python qa_index.py --bench')